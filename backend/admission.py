@@ -0,0 +1,82 @@
+"""Admission control for expensive endpoints.
+
+Each heavy operation runs behind a named ``ConcurrencyLimiter`` so it cannot
+take over the database connection pool and starve cheap requests. Limits are
+configured with ``CONCURRENCY_LIMITS`` (``name=limit`` pairs separated by
+commas, e.g. ``delivery-notes=4,statistics=2``). A request that cannot get a
+slot within ``ADMISSION_QUEUE_TIMEOUT_SECONDS`` gets 503, and one arriving
+when ``ADMISSION_MAX_QUEUE`` requests are already waiting gets 429 right away;
+both carry Retry-After.
+
+Reads coalesced through ``SingleFlight`` (delivery-notes, statistics) are
+already bounded to about one query per process; their limiters only come
+into play when writes invalidate the shared result and reloads overlap.
+Uncoalesced heavy reads (clients, products, autocomplete) rely on their
+limiters alone.
+"""
+import asyncio
+import math
+import os
+from pathlib import Path
+from typing import Dict
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+
+load_dotenv(Path(__file__).parent / '.env')
+
+QUEUE_TIMEOUT_SECONDS = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", "100"))
+
+
+def parse_limits(value: str) -> Dict[str, int]:
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, limit = item.partition("=")
+        limits[name.strip()] = int(limit)
+    return limits
+
+
+CONFIGURED_LIMITS = parse_limits(os.environ.get("CONCURRENCY_LIMITS", ""))
+
+
+class ConcurrencyLimiter:
+    def __init__(self, name: str, limit: int, queue_timeout: float = QUEUE_TIMEOUT_SECONDS,
+                 max_queue: int = MAX_QUEUE):
+        self.name = name
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.semaphore = asyncio.Semaphore(limit)
+        # Requests running or queued for a slot
+        self.pending = 0
+
+    def retry_after(self) -> Dict[str, str]:
+        return {"Retry-After": str(max(1, math.ceil(self.queue_timeout)))}
+
+    async def __aenter__(self):
+        if self.pending >= self.limit + self.max_queue:
+            raise HTTPException(
+                status_code=429, detail="Demasiadas solicitudes, intente más tarde", headers=self.retry_after()
+            )
+        self.pending += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.pending -= 1
+            raise HTTPException(
+                status_code=503, detail="Servicio ocupado, intente más tarde", headers=self.retry_after()
+            )
+        except BaseException:
+            self.pending -= 1
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.pending -= 1
+        self.semaphore.release()
+
+
+def limiter(name: str, default_limit: int) -> ConcurrencyLimiter:
+    """Limiter for name, using CONCURRENCY_LIMITS when it sets one"""
+    return ConcurrencyLimiter(name, CONFIGURED_LIMITS.get(name, default_limit))
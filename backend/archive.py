@@ -0,0 +1,121 @@
+"""Move old delivery notes out of the hot collection.
+
+    python archive.py --older-than-days 180
+
+Notes whose ``created_at`` is older than the cutoff are copied into
+``delivery_notes_archive`` and then removed from ``delivery_notes``, so the
+hot collection and its indexes only hold recent notes. The API falls back to
+the archive when a note is not found in the hot collection.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReplaceOne, UpdateOne
+
+load_dotenv(Path(__file__).parent / '.env')
+
+ARCHIVE_COLLECTION = "delivery_notes_archive"
+DEFAULT_ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "180"))
+
+cli = typer.Typer(help="Archiva notas de entrega antiguas")
+
+
+async def ensure_archive_indexes(db):
+    await db.delivery_notes.create_index([("created_at", DESCENDING)])
+    # Only notes still in the legacy layout carry a string id
+    await db[ARCHIVE_COLLECTION].create_index([("id", ASCENDING)], sparse=True)
+    await db[ARCHIVE_COLLECTION].create_index([("created_at", DESCENDING)])
+
+
+async def move_batch(source, target, batch: List[Dict], encode: Callable[[Dict], Dict] = dict) -> List:
+    """Copy a batch of documents into target, then remove them from source.
+
+    Returns the _ids of source documents left in place. This is safe while the
+    API keeps writing, without transactions: a source document is only removed
+    if it still matches what was read, and when it changed or was deleted
+    meanwhile its copy is removed again. API writes that target the source
+    document after it was removed miss and look the note up again (see
+    ``MongoRepository.update_note``), so neither an update nor a delete can be
+    lost or undone. Copies are insert-only upserts; a copy left behind by an
+    interrupted run is refreshed from the source, which stays authoritative
+    until it is removed.
+    """
+    copies = [encode(doc) for doc in batch]
+    inserts = [
+        UpdateOne({"_id": copy["_id"]}, {"$setOnInsert": {k: v for k, v in copy.items() if k != "_id"}}, upsert=True)
+        for copy in copies
+    ]
+    result = await target.bulk_write(inserts, ordered=False)
+    leftovers = [copy for index, copy in enumerate(copies) if index not in result.upserted_ids]
+    if leftovers:
+        await target.bulk_write([ReplaceOne({"_id": copy["_id"]}, copy) for copy in leftovers], ordered=False)
+
+    # Whole-document equality, so an update that only added a field also counts as a change
+    deleted = await asyncio.gather(*(
+        source.delete_one({"_id": doc["_id"], "$expr": {"$eq": ["$$ROOT", {"$literal": doc}]}}) for doc in batch
+    ))
+    kept = [(doc, copy) for doc, copy, result in zip(batch, copies, deleted) if not result.deleted_count]
+    if kept:
+        await target.delete_many({"_id": {"$in": [copy["_id"] for _, copy in kept]}})
+    return [doc["_id"] for doc, _ in kept]
+
+
+async def archive_old_notes(db, older_than_days: int, batch_size: int = 1000, progress=None) -> int:
+    """Move notes created before now - older_than_days into the archive, returns how many moved.
+
+    Batches go through ``move_batch``, so the API can keep serving and an
+    interrupted run can simply be started again. Notes changed by the API
+    while being moved stay in the hot collection until the next run.
+    """
+    await ensure_archive_indexes(db)
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    query = {"created_at": {"$lt": cutoff}}
+    total = await db.delivery_notes.count_documents(query)
+
+    moved = 0
+    skipped = []
+    while True:
+        batch = await db.delivery_notes.find({**query, "_id": {"$nin": skipped}}).sort(
+            "created_at", ASCENDING
+        ).to_list(batch_size)
+        if not batch:
+            break
+        kept = await move_batch(db.delivery_notes, db[ARCHIVE_COLLECTION], batch)
+        skipped += kept
+        moved += len(batch) - len(kept)
+        if progress:
+            await progress(moved + len(skipped), total)
+    return moved
+
+
+@cli.command()
+def main(
+    older_than_days: int = typer.Option(DEFAULT_ARCHIVE_AFTER_DAYS, help="Archive notes older than this many days"),
+    batch_size: int = typer.Option(1000, help="Notes moved per batch"),
+    mongo_url: Optional[str] = typer.Option(None, help="Defaults to MONGO_URL from .env"),
+    db_name: Optional[str] = typer.Option(None, help="Defaults to DB_NAME from .env"),
+):
+    async def run():
+        mongo = AsyncIOMotorClient(mongo_url or os.environ["MONGO_URL"])
+        try:
+            async def progress(moved, total):
+                typer.echo(f"\r   archived {moved}/{total}", nl=False)
+
+            started = time.perf_counter()
+            moved = await archive_old_notes(mongo[db_name or os.environ["DB_NAME"]], older_than_days, batch_size, progress)
+            typer.echo(f"\n✅ Archived {moved} notes older than {older_than_days} days in {time.perf_counter() - started:.1f}s")
+        finally:
+            mongo.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    cli()
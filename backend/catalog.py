@@ -0,0 +1,158 @@
+"""Product catalog derived from delivery note lines.
+
+Every product line is filed under a normalized key (upper case, no accents,
+single spaces), so spelling variants of the same item share one entry with
+running ``package_quantity``/``sale_quantity`` totals. Repositories keep the
+catalog current as notes are created, updated and deleted; this module also
+rebuilds it from scratch:
+
+    python catalog.py
+"""
+import asyncio
+import re
+import time
+import unicodedata
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+import typer
+from dotenv import load_dotenv
+from pymongo import UpdateOne
+
+from archive import ARCHIVE_COLLECTION
+
+load_dotenv(Path(__file__).parent / '.env')
+
+CATALOG_COLLECTION = "product_catalog"
+TOTAL_FIELDS = ("line_count", "total_package_quantity", "total_sale_quantity")
+
+cli = typer.Typer(help="Reconstruye el catálogo de productos")
+
+
+def product_key(description: str) -> str:
+    text = unicodedata.normalize("NFKD", description)
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return re.sub(r"\s+", " ", text).strip().upper()
+
+
+def merge_deltas(entries: Dict[str, Dict], deltas: Dict[str, Dict]):
+    """Fold deltas into accumulated catalog entries keyed by product key"""
+    for key, delta in deltas.items():
+        entry = entries.setdefault(key, dict.fromkeys(TOTAL_FIELDS, 0))
+        for field in TOTAL_FIELDS:
+            entry[field] += delta[field]
+        if "description" in delta:
+            entry.update(description=delta["description"], package_unit=delta["package_unit"],
+                         sale_unit=delta["sale_unit"])
+
+
+def catalog_deltas(added: List[Dict], removed: List[Dict] = ()) -> Dict[str, Dict]:
+    """Per-product changes to the running totals when lines are added and/or removed"""
+    deltas: Dict[str, Dict] = {}
+    for lines, sign in ((removed, -1), (added, 1)):
+        for line in lines:
+            key = product_key(line["description"])
+            if not key:
+                continue
+            delta = deltas.setdefault(key, dict.fromkeys(TOTAL_FIELDS, 0))
+            delta["line_count"] += sign
+            delta["total_package_quantity"] += sign * line["package_quantity"]
+            delta["total_sale_quantity"] += sign * line["sale_quantity"]
+            if sign > 0:
+                # The latest spelling and units become the ones shown
+                delta["description"] = line["description"].strip()
+                delta["package_unit"] = line["package_unit"]
+                delta["sale_unit"] = line["sale_unit"]
+    return {key: delta for key, delta in deltas.items() if delta["line_count"] or "description" in delta}
+
+
+def mongo_catalog_updates(deltas: Dict[str, Dict]) -> List[UpdateOne]:
+    now = datetime.now(timezone.utc)
+    updates = []
+    for key, delta in deltas.items():
+        update = {"$inc": {field: delta[field] for field in TOTAL_FIELDS}}
+        if "description" in delta:
+            update["$set"] = {
+                "description": delta["description"],
+                "package_unit": delta["package_unit"],
+                "sale_unit": delta["sale_unit"],
+                "updated_at": now,
+            }
+        updates.append(UpdateOne({"_id": key}, update, upsert="description" in delta))
+    return updates
+
+
+def catalog_corrections(rebuilt: Dict[str, Dict], live: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Deltas that turn the live totals into the rebuilt ones"""
+    corrections: Dict[str, Dict] = {}
+    for key in rebuilt.keys() | live.keys():
+        target, current = rebuilt.get(key, {}), live.get(key, {})
+        correction = {field: target.get(field, 0) - current.get(field, 0) for field in TOTAL_FIELDS}
+        if key in rebuilt:
+            correction.update(description=target["description"], package_unit=target["package_unit"],
+                              sale_unit=target["sale_unit"])
+        elif not any(correction.values()):
+            continue
+        corrections[key] = correction
+    return corrections
+
+
+async def rebuild_mongo_catalog(db, progress=None, batch_size: int = 1000) -> int:
+    """Recompute the catalog from every hot and archived note, returns the number of products.
+
+    The API keeps updating the catalog during the scan, so instead of
+    replacing it the rebuild snapshots the live totals when it starts, scans
+    the notes created up to then and applies the difference as increments.
+    Notes created meanwhile are kept on top. Without transactions the scan is
+    not a snapshot, though: a note updated or deleted after the start, before
+    the scan reaches it, is counted by both the scan and the live increments,
+    and archiving moves notes between the collections being scanned. Run it
+    while no notes are being edited, deleted or archived (the SQLite rebuild
+    reads a consistent snapshot and has no such restriction).
+    """
+    started = datetime.now(timezone.utc)
+    live = {entry.pop("_id"): entry async for entry in db[CATALOG_COLLECTION].find({}, dict.fromkeys(TOTAL_FIELDS, 1))}
+    query = {"created_at": {"$lte": started}}
+    total = await db.delivery_notes.count_documents(query) + await db[ARCHIVE_COLLECTION].count_documents(query)
+    scanned = 0
+    entries: Dict[str, Dict] = {}
+    # Oldest first (archive, then hot notes) so the latest spelling of each product wins
+    for collection in (db[ARCHIVE_COLLECTION], db.delivery_notes):
+        async for note in collection.find(query, {"products": 1}).sort("created_at", 1):
+            merge_deltas(entries, catalog_deltas(note.get("products", [])))
+            scanned += 1
+            if progress and scanned % 10000 == 0:
+                await progress(scanned, total)
+
+    updates = mongo_catalog_updates(catalog_corrections(entries, live))
+    for start in range(0, len(updates), batch_size):
+        await db[CATALOG_COLLECTION].bulk_write(updates[start:start + batch_size], ordered=False)
+    await db[CATALOG_COLLECTION].delete_many({"line_count": {"$lte": 0}})
+    if progress:
+        await progress(scanned, total)
+    return len(entries)
+
+
+@cli.command()
+def main():
+    """Rebuild the catalog of the configured STORAGE_BACKEND"""
+    from repository import create_repository
+
+    async def run():
+        repo = create_repository()
+        try:
+            async def progress(scanned, total):
+                typer.echo(f"\r   scanned {scanned}/{total} notes", nl=False)
+
+            started = time.perf_counter()
+            products = await repo.rebuild_product_catalog(progress)
+            typer.echo(f"\n✅ Catalog rebuilt with {products} products in {time.perf_counter() - started:.1f}s")
+        finally:
+            await repo.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    cli()
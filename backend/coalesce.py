@@ -0,0 +1,42 @@
+"""Single-flight coalescing for hot read endpoints.
+
+Concurrent callers asking for the same key share one in-flight call and its
+result instead of each querying the database. With a ``ttl`` the result is
+also kept for that many seconds (a micro-cache). Writes call ``forget`` so
+later readers never join a call that started before the write.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    def __init__(self, ttl: float = 0.0):
+        self.ttl = ttl
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.cache: Dict[str, Tuple[float, Any]] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        cached = self.cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        future = self.in_flight.get(key)
+        if future is None:
+            # Runs as its own task so one caller disconnecting does not cancel it for the rest
+            future = asyncio.ensure_future(fn())
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self.finish(key, done))
+        return await asyncio.shield(future)
+
+    def finish(self, key: str, future: asyncio.Future):
+        failed = future.cancelled() or future.exception() is not None
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+            if self.ttl > 0 and not failed:
+                self.cache[key] = (time.monotonic() + self.ttl, future.result())
+
+    def forget(self, *keys: str):
+        for key in keys:
+            self.in_flight.pop(key, None)
+            self.cache.pop(key, None)
@@ -0,0 +1,117 @@
+"""Idempotency-Key support for POST endpoints.
+
+A client that sends ``Idempotency-Key: <unique value>`` with a POST can retry
+it safely: the first successful response is stored (for
+``IDEMPOTENCY_TTL_SECONDS``) and replayed for every retry with the same key,
+without running the handler again. Reusing a key for a different request is
+rejected with 422, and a retry that arrives while the original is still
+running gets 409 with Retry-After. A reservation whose request never
+finished (the worker crashed or was killed) is only honored for
+``IDEMPOTENCY_LEASE_SECONDS``; after that the next retry takes it over.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / '.env')
+
+IDEMPOTENCY_HEADER = b"idempotency-key"
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# Longer than any POST handler may take
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "60"))
+MAX_KEY_LENGTH = 255
+
+
+def json_response(status_code: int, detail: str, extra_headers=()):
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    return status_code, headers + list(extra_headers), body
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware replaying stored responses for repeated Idempotency-Keys"""
+
+    def __init__(self, app, get_store):
+        self.app = app
+        # The repository is opened in the app lifespan, after middleware is built
+        self.get_store = get_store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        key = dict(scope["headers"]).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return await self.app(scope, receive, send)
+
+        key = key.decode("latin-1").strip()
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await self.respond(send, *json_response(400, "Idempotency-Key inválida"))
+
+        # Read the whole body to fingerprint it, then hand it to the app unchanged
+        messages = []
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request" or not message.get("more_body"):
+                break
+        body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.request")
+        fingerprint = hashlib.sha256(
+            scope["path"].encode() + b"?" + scope.get("query_string", b"") + b"\n" + body
+        ).hexdigest()
+
+        store = self.get_store()
+        existing = await store.reserve_idempotency_key(key, fingerprint)
+        if existing is not None:
+            if existing["fingerprint"] != fingerprint:
+                return await self.respond(send, *json_response(
+                    422, "Idempotency-Key ya fue usada con otra solicitud"
+                ))
+            if existing["status_code"] is None:
+                return await self.respond(send, *json_response(
+                    409, "Solicitud con esta Idempotency-Key en curso", [(b"retry-after", b"1")]
+                ))
+            headers = [
+                (b"content-type", existing["content_type"].encode("latin-1")),
+                (b"content-length", str(len(existing["body"])).encode()),
+                (b"idempotent-replayed", b"true"),
+            ]
+            return await self.respond(send, existing["status_code"], headers, existing["body"])
+
+        async def replay_receive():
+            if messages:
+                return messages.pop(0)
+            return await receive()
+
+        response = {"status": None, "content_type": "application/json", "body": []}
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                for name, value in message.get("headers", []):
+                    if name.lower() == b"content-type":
+                        response["content_type"] = value.decode("latin-1")
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            await store.release_idempotency_key(key)
+            raise
+
+        # Only successful results are kept; failures may be retried for real
+        if response["status"] is not None and 200 <= response["status"] < 300:
+            await store.complete_idempotency_key(
+                key, response["status"], response["content_type"], b"".join(response["body"])
+            )
+        else:
+            await store.release_idempotency_key(key)
+
+    @staticmethod
+    async def respond(send, status_code, headers, body):
+        await send({"type": "http.response.start", "status": status_code, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,289 @@
+"""In-process background jobs for long-running operations.
+
+Jobs are persisted through the repository, so every worker process can claim
+them and they survive restarts. Each process runs a ``JobRunner`` with
+``JOB_WORKERS`` concurrent slots. Running jobs send a heartbeat; jobs whose
+heartbeat stops (the process died) are put back in the queue, up to
+``MAX_ATTEMPTS`` times. A graceful shutdown requeues its running jobs right
+away. All built-in handlers can safely run again from the start. Result
+files older than ``JOB_RESULT_RETENTION_DAYS`` are deleted by the sweep.
+
+Handlers are registered with ``@job_handler("type")`` and receive a
+``JobContext`` (for progress reporting) and the job params. What they return
+is stored as the job result.
+"""
+import asyncio
+import csv
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", "2"))
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("JOB_HEARTBEAT_SECONDS", "5"))
+JOB_RESULTS_DIR = Path(os.environ.get("JOB_RESULTS_DIR", str(ROOT_DIR / "job_results")))
+JOB_RESULT_RETENTION_DAYS = float(os.environ.get("JOB_RESULT_RETENTION_DAYS", "7"))
+MAX_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+HANDLERS: Dict[str, Callable[["JobContext", Dict], Awaitable]] = {}
+# Repository method a job type needs, for types not every storage backend supports
+REQUIREMENTS: Dict[str, str] = {}
+
+
+def job_handler(job_type: str, requires: Optional[str] = None):
+    def register(fn):
+        HANDLERS[job_type] = fn
+        if requires:
+            REQUIREMENTS[job_type] = requires
+        return fn
+    return register
+
+
+def job_supported(job_type: str, repo) -> bool:
+    if job_type not in HANDLERS:
+        return False
+    requires = REQUIREMENTS.get(job_type)
+    return requires is None or callable(getattr(repo, requires, None))
+
+
+def purge_results(retention_days: float) -> int:
+    """Delete result files last written more than retention_days ago, returns how many"""
+    if not JOB_RESULTS_DIR.is_dir():
+        return 0
+    cutoff = time.time() - retention_days * 86400
+    purged = 0
+    for path in JOB_RESULTS_DIR.iterdir():
+        if path.is_file() and path.stat().st_mtime < cutoff:
+            path.unlink(missing_ok=True)
+            purged += 1
+    return purged
+
+
+def new_job(job_type: str, params: Dict) -> Dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "type": job_type,
+        "params": params,
+        "status": "queued",
+        "progress": 0.0,
+        "message": "",
+        "result": None,
+        "result_file": None,
+        "error": None,
+        "attempts": 0,
+        "cancel_requested": False,
+        "worker": None,
+        "created_at": datetime.now(timezone.utc),
+        "started_at": None,
+        "heartbeat_at": None,
+        "finished_at": None,
+    }
+
+
+class JobContext:
+    def __init__(self, runner: "JobRunner", job: Dict):
+        self.runner = runner
+        self.repo = runner.repo
+        self.job = job
+        self.last_progress = -1.0
+
+    async def progress(self, done: int, total: int, message: str = ""):
+        """Record progress; raises CancelledError once cancellation has been requested"""
+        percent = round(100.0 * done / total, 1) if total else 0.0
+        if percent - self.last_progress < 1 and done < total:
+            return
+        self.last_progress = percent
+        job = await self.repo.update_job(self.job["id"], {
+            "progress": min(percent, 100.0),
+            "message": message,
+            "heartbeat_at": datetime.now(timezone.utc),
+        })
+        if job and job.get("cancel_requested"):
+            raise asyncio.CancelledError()
+
+    def result_path(self, suffix: str) -> Path:
+        JOB_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        return JOB_RESULTS_DIR / f"{self.job['id']}{suffix}"
+
+
+class JobRunner:
+    def __init__(self, repo, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_SECONDS,
+                 heartbeat_interval: float = JOB_HEARTBEAT_SECONDS):
+        self.repo = repo
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.wakeup = asyncio.Event()
+        self.tasks = []
+        self.stopping = False
+
+    @property
+    def stale_after(self) -> timedelta:
+        return timedelta(seconds=self.heartbeat_interval * 6)
+
+    async def start(self):
+        await self.requeue_stale()
+        self.tasks = [asyncio.create_task(self.work()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.create_task(self.sweep()))
+
+    async def stop(self):
+        self.stopping = True
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+    def notify(self):
+        """Wake an idle slot right away instead of waiting for the next poll"""
+        self.wakeup.set()
+
+    async def requeue_stale(self):
+        requeued = await self.repo.requeue_stale_jobs(datetime.now(timezone.utc) - self.stale_after, MAX_ATTEMPTS)
+        if requeued:
+            logger.info("Requeued %d interrupted jobs", requeued)
+
+    async def sweep(self):
+        while True:
+            await asyncio.sleep(self.stale_after.total_seconds())
+            try:
+                await self.requeue_stale()
+            except Exception:
+                logger.exception("Failed to requeue interrupted jobs")
+            try:
+                purged = await asyncio.to_thread(purge_results, JOB_RESULT_RETENTION_DAYS)
+            except Exception:
+                logger.exception("Failed to delete expired job results")
+            else:
+                if purged:
+                    logger.info("Deleted %d expired job results", purged)
+
+    async def work(self):
+        while True:
+            try:
+                job = await self.repo.claim_job(self.worker_id)
+            except Exception:
+                logger.exception("Failed to claim a job")
+                job = None
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run(job)
+
+    async def heartbeat(self, job_id: str, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                job = await self.repo.update_job(job_id, {"heartbeat_at": datetime.now(timezone.utc)})
+            except Exception:
+                # Keep beating, or the job would be requeued while it is still running
+                logger.exception("Failed to record the heartbeat of job %s", job_id)
+                continue
+            if job and job.get("cancel_requested"):
+                task.cancel()
+
+    async def run(self, job: Dict):
+        if not job_supported(job["type"], self.repo):
+            await self.finish(job["id"], "failed", error=f"Tipo de trabajo no disponible: {job['type']}")
+            return
+        handler = HANDLERS[job["type"]]
+
+        logger.info("Running job %s (%s)", job["id"], job["type"])
+        task = asyncio.create_task(handler(JobContext(self, job), job["params"]))
+        heartbeat = asyncio.create_task(self.heartbeat(job["id"], task))
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            if self.stopping:
+                # Shutting down: hand the job back so it runs again after the restart, without using up an attempt
+                await self.repo.update_job(job["id"], {
+                    "status": "queued", "progress": 0.0, "message": "", "worker": None,
+                    "heartbeat_at": None, "attempts": job["attempts"] - 1,
+                })
+                raise
+            await self.finish(job["id"], "cancelled")
+        except Exception as exc:
+            logger.exception("Job %s failed", job["id"])
+            await self.finish(job["id"], "failed", error=str(exc))
+        else:
+            fields = {"progress": 100.0}
+            if isinstance(result, Path):
+                fields["result_file"] = str(result)
+            else:
+                fields["result"] = result
+            await self.finish(job["id"], "succeeded", **fields)
+        finally:
+            heartbeat.cancel()
+
+    async def finish(self, job_id: str, status: str, **fields):
+        await self.repo.update_job(job_id, {"status": status, "finished_at": datetime.now(timezone.utc), **fields})
+
+
+# Built-in jobs
+
+@job_handler("archive-notes", requires="archive_notes")
+async def archive_notes_job(ctx: JobContext, params: Dict):
+    from archive import DEFAULT_ARCHIVE_AFTER_DAYS
+
+    async def progress(moved, total):
+        await ctx.progress(moved, total, f"{moved}/{total} notas archivadas")
+
+    days = int(params.get("older_than_days", DEFAULT_ARCHIVE_AFTER_DAYS))
+    return {"archived": await ctx.repo.archive_notes(days, progress)}
+
+
+@job_handler("rebuild-catalog")
+async def rebuild_catalog_job(ctx: JobContext, params: Dict):
+    # On Mongo, edits and deletes made during the scan can be counted twice, see rebuild_mongo_catalog
+    async def progress(scanned, total):
+        await ctx.progress(scanned, total, f"{scanned}/{total} notas procesadas")
+
+    return {"products": await ctx.repo.rebuild_product_catalog(progress)}
+
+
+@job_handler("statistics")
+async def statistics_job(ctx: JobContext, params: Dict):
+    return await ctx.repo.statistics()
+
+
+@job_handler("export-notes")
+async def export_notes_job(ctx: JobContext, params: Dict) -> Path:
+    """CSV with one row per product line of every note"""
+    total = await ctx.repo.count_notes()
+    path = ctx.result_path(".csv")
+    exported = 0
+    with path.open("w", newline="", encoding="utf-8") as handle:
+        writer = csv.writer(handle)
+        writer.writerow([
+            "note_number", "issue_date", "client_name", "client_rif_ci", "delivery_address", "transport",
+            "description", "package_unit", "package_quantity", "sale_unit", "sale_quantity",
+        ])
+        async for notes in ctx.repo.iter_notes(1000):
+            for note in notes:
+                client_info = note["client_info"]
+                for product in note["products"] or [{}]:
+                    writer.writerow([
+                        note["note_number"], note["issue_date"], client_info["name"], client_info["rif_ci"],
+                        note["delivery_location"]["address"], note.get("transport") or "",
+                        product.get("description", ""), product.get("package_unit", ""),
+                        product.get("package_quantity", ""), product.get("sale_unit", ""),
+                        product.get("sale_quantity", ""),
+                    ])
+            exported += len(notes)
+            await ctx.progress(exported, total, f"{exported}/{total} notas exportadas")
+    return path
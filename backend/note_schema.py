@@ -0,0 +1,168 @@
+"""Compact storage encoding for delivery notes, plus the migration to it.
+
+    python note_schema.py --batch-size 2000
+
+Stored notes use the note UUID as a native BSON UUID ``_id`` instead of a
+separate string ``id``, keep only the client fields that matter in a note
+snapshot and omit empty optional fields. ``decode_note`` rebuilds the full
+``DeliveryNote`` shape, so the API is unchanged. Legacy documents decode as
+well, which lets the migration run while the API is serving traffic.
+"""
+import asyncio
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Optional
+
+import typer
+from bson.binary import Binary
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import OperationFailure
+
+from archive import ARCHIVE_COLLECTION, move_batch
+
+load_dotenv(Path(__file__).parent / '.env')
+
+SNAPSHOT_CLIENT_FIELDS = ("name", "rif_ci", "address", "payment_condition")
+OPTIONAL_NOTE_DEFAULTS = {
+    "transport": "",
+    "received_by_name": "",
+    "received_by_cedula": "",
+    "received_date": None,
+}
+
+cli = typer.Typer(help="Migra las notas de entrega al esquema compacto")
+
+
+def note_key(note_id: str):
+    """BSON _id for a note id; ids that are not UUIDs are kept as strings"""
+    try:
+        return Binary.from_uuid(uuid.UUID(note_id))
+    except ValueError:
+        return note_id
+
+
+def note_filter(note_id: str) -> Dict:
+    """Matches a note whether it is stored compact or in the legacy layout"""
+    return {"$or": [{"_id": note_key(note_id)}, {"id": note_id}]}
+
+
+def encode_note(note: Dict) -> Dict:
+    """Turn a DeliveryNote dump (or legacy document) into its compact stored form"""
+    doc = {"_id": note_key(note["id"])}
+    for key, value in note.items():
+        if key in ("_id", "id"):
+            continue
+        if key in OPTIONAL_NOTE_DEFAULTS and value in ("", None):
+            continue
+        doc[key] = value
+    doc["client_info"] = encode_client_snapshot(note["client_info"])
+    return doc
+
+
+def encode_client_snapshot(client_info: Dict) -> Dict:
+    return {field: client_info[field] for field in SNAPSHOT_CLIENT_FIELDS}
+
+
+def decode_note(doc: Dict) -> Dict:
+    """Rebuild the DeliveryNote fields from a compact or legacy stored document"""
+    note = {key: value for key, value in doc.items() if key != "_id"}
+    if "id" not in note:
+        key = doc["_id"]
+        note["id"] = str(key.as_uuid()) if isinstance(key, Binary) else key
+    for field, default in OPTIONAL_NOTE_DEFAULTS.items():
+        note.setdefault(field, default)
+
+    client_info = dict(note["client_info"])
+    if "id" not in client_info:
+        # The snapshot held the counter as it was before this note was numbered
+        suffix = note["note_number"].rsplit("-", 1)[-1]
+        client_info["id"] = note["client_id"]
+        client_info["last_note_number"] = int(suffix) - 1 if suffix.isdigit() else 0
+        client_info["created_at"] = note["created_at"]
+    note["client_info"] = client_info
+    return note
+
+
+async def collection_size(db, name: str) -> Optional[Dict]:
+    try:
+        stats = await db.command("collStats", name)
+    except OperationFailure:
+        return None
+    return {
+        "count": stats.get("count", 0),
+        "size": stats.get("size", 0),
+        "storage_size": stats.get("storageSize", 0),
+        "index_size": stats.get("totalIndexSize", 0),
+    }
+
+
+async def migrate_collection(db, name: str, batch_size: int, pause: float = 0.0, progress=None) -> int:
+    """Rewrite legacy documents of one collection in batches, returns how many were migrated.
+
+    Batches go through ``move_batch`` (new documents are written under their
+    new _id before the legacy ones are removed), so the migration is safe while
+    the API is serving and can be interrupted and resumed at any point. Notes
+    changed by the API while being rewritten keep the legacy layout until the
+    next run; API writes aimed at a legacy document that was just replaced
+    miss its old _id and retry against the rewritten one.
+    """
+    collection = db[name]
+    legacy = {"id": {"$exists": True}}
+    total = await collection.count_documents(legacy)
+
+    migrated = 0
+    skipped = []
+    while True:
+        batch = await collection.find({**legacy, "_id": {"$nin": skipped}}).to_list(batch_size)
+        if not batch:
+            break
+        kept = await move_batch(collection, collection, batch, encode_note)
+        skipped += kept
+        migrated += len(batch) - len(kept)
+        if progress:
+            await progress(name, migrated + len(skipped), total)
+        if pause:
+            await asyncio.sleep(pause)
+    return migrated
+
+
+def format_size(stats: Optional[Dict]) -> str:
+    if stats is None:
+        return "n/a"
+    return (f"{stats['count']} docs, data {stats['size'] / 1048576:.1f} MiB, "
+            f"storage {stats['storage_size'] / 1048576:.1f} MiB, indexes {stats['index_size'] / 1048576:.1f} MiB")
+
+
+@cli.command()
+def main(
+    batch_size: int = typer.Option(1000, help="Documents rewritten per batch"),
+    pause: float = typer.Option(0.0, help="Seconds to sleep between batches to limit load on a live server"),
+    mongo_url: Optional[str] = typer.Option(None, help="Defaults to MONGO_URL from .env"),
+    db_name: Optional[str] = typer.Option(None, help="Defaults to DB_NAME from .env"),
+):
+    async def run():
+        mongo = AsyncIOMotorClient(mongo_url or os.environ["MONGO_URL"])
+        db = mongo[db_name or os.environ["DB_NAME"]]
+        try:
+            async def progress(name, migrated, total):
+                typer.echo(f"\r   {name}: {migrated}/{total}", nl=False)
+
+            for name in ("delivery_notes", ARCHIVE_COLLECTION):
+                before = await collection_size(db, name)
+                started = time.perf_counter()
+                migrated = await migrate_collection(db, name, batch_size, pause, progress)
+                after = await collection_size(db, name)
+                typer.echo(f"\n✅ {name}: migrated {migrated} documents in {time.perf_counter() - started:.1f}s")
+                typer.echo(f"   before: {format_size(before)}")
+                typer.echo(f"   after:  {format_size(after)}")
+        finally:
+            mongo.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    cli()
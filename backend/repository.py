@@ -0,0 +1,440 @@
+"""Data access for the API behind a storage-agnostic interface.
+
+Routes talk to a ``Repository``; ``create_repository`` picks the engine from
+``STORAGE_BACKEND`` (``mongo``, the default, or ``sqlite``). Repositories take
+and return plain dicts shaped like the model dumps in ``server.py``.
+"""
+import os
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from archive import ARCHIVE_COLLECTION, archive_old_notes
+from catalog import CATALOG_COLLECTION, catalog_deltas, mongo_catalog_updates, product_key, rebuild_mongo_catalog
+from idempotency import IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_TTL_SECONDS
+from note_schema import decode_note, encode_client_snapshot, encode_note, note_filter
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+
+class Repository(ABC):
+    # Company config (a single document)
+    @abstractmethod
+    async def replace_company_config(self, config: Dict) -> None: ...
+
+    @abstractmethod
+    async def get_company_config(self) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def set_company_logo(self, logo: str) -> None: ...
+
+    # Clients
+    @abstractmethod
+    async def insert_client(self, client: Dict) -> None: ...
+
+    @abstractmethod
+    async def list_clients(self, limit: int = 1000) -> List[Dict]: ...
+
+    @abstractmethod
+    async def get_client(self, client_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def take_note_number(self, client_id: str) -> Optional[Tuple[Dict, int]]:
+        """Atomically bump the client's note counter.
+
+        Returns the client as it was before the bump and the new number, or
+        None when the client does not exist.
+        """
+
+    # Delivery notes
+    @abstractmethod
+    async def insert_note(self, note: Dict) -> None: ...
+
+    @abstractmethod
+    async def list_notes(self, limit: int = 1000) -> List[Dict]:
+        """Most recent notes first"""
+
+    @abstractmethod
+    async def get_note(self, note_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def update_note(self, note_id: str, fields: Dict) -> Optional[Dict]:
+        """Apply fields to a note and return it updated, or None if it does not exist"""
+
+    @abstractmethod
+    async def delete_note(self, note_id: str) -> bool: ...
+
+    @abstractmethod
+    async def statistics(self) -> Dict:
+        """total_notes, total_clients and notes_by_client ([{"_id": name, "count": n}])"""
+
+    @abstractmethod
+    async def count_notes(self) -> int: ...
+
+    @abstractmethod
+    def iter_notes(self, batch_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Every note, archived ones included, in batches, oldest first"""
+
+    # Product catalog, kept current by the note write methods above
+    @abstractmethod
+    async def autocomplete_products(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Catalog entries whose normalized key starts with prefix, most used first"""
+
+    @abstractmethod
+    async def list_products(self, limit: int = 1000) -> List[Dict]: ...
+
+    @abstractmethod
+    async def rebuild_product_catalog(self, progress=None) -> int:
+        """Recompute the catalog from all notes, returns the number of products"""
+
+    # Idempotency keys
+    @abstractmethod
+    async def reserve_idempotency_key(self, key: str, fingerprint: str) -> Optional[Dict]:
+        """Claim key for a new request.
+
+        Returns None when the key was free or held by a pending reservation
+        older than IDEMPOTENCY_LEASE_SECONDS (the caller must later complete or
+        release it), otherwise the stored record: fingerprint, status_code
+        (None while the original request is still running), content_type and body.
+        """
+
+    @abstractmethod
+    async def complete_idempotency_key(self, key: str, status_code: int, content_type: str, body: bytes) -> None: ...
+
+    @abstractmethod
+    async def release_idempotency_key(self, key: str) -> None: ...
+
+    # Background jobs (see jobs.py)
+    @abstractmethod
+    async def insert_job(self, job: Dict) -> None: ...
+
+    @abstractmethod
+    async def get_job(self, job_id: str) -> Optional[Dict]: ...
+
+    @abstractmethod
+    async def list_jobs(self, limit: int = 100) -> List[Dict]:
+        """Most recent jobs first"""
+
+    @abstractmethod
+    async def claim_job(self, worker: str) -> Optional[Dict]:
+        """Atomically move the oldest queued job to running for worker and return it.
+
+        Counts one more attempt; returns None when nothing is queued.
+        """
+
+    @abstractmethod
+    async def update_job(self, job_id: str, fields: Dict) -> Optional[Dict]:
+        """Apply fields to a job and return it updated, or None if it does not exist"""
+
+    @abstractmethod
+    async def request_job_cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued job right away or flag a running one for its worker.
+
+        Returns the job afterwards, or None if it does not exist.
+        """
+
+    @abstractmethod
+    async def requeue_stale_jobs(self, heartbeat_before: datetime, max_attempts: int) -> int:
+        """Put running jobs whose heartbeat stopped before the cutoff back in the queue.
+
+        Jobs that already used max_attempts fail and jobs flagged for
+        cancellation are cancelled instead. Returns how many were requeued.
+        """
+
+    @abstractmethod
+    async def ping(self) -> None:
+        """Raise if the storage engine is not reachable"""
+
+    async def ensure_indexes(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+def mongo_pool_options() -> Dict:
+    """AsyncIOMotorClient pool settings from MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_CONNECTING and MONGO_WAIT_QUEUE_TIMEOUT_MS (driver defaults when unset)"""
+    settings = {
+        'maxPoolSize': 'MONGO_MAX_POOL_SIZE',
+        'minPoolSize': 'MONGO_MIN_POOL_SIZE',
+        'maxConnecting': 'MONGO_MAX_CONNECTING',
+        'waitQueueTimeoutMS': 'MONGO_WAIT_QUEUE_TIMEOUT_MS',
+    }
+    return {option: int(os.environ[env]) for option, env in settings.items() if os.environ.get(env)}
+
+
+class MongoRepository(Repository):
+    def __init__(self, mongo_url: str, db_name: str, **pool_options):
+        self.client = AsyncIOMotorClient(mongo_url, **pool_options)
+        self.db = self.client[db_name]
+        self.archived_notes = self.db[ARCHIVE_COLLECTION]
+
+    async def replace_company_config(self, config):
+        # Only one company config allowed
+        await self.db.company_config.delete_many({})
+        await self.db.company_config.insert_one(dict(config))
+
+    async def get_company_config(self):
+        return await self.db.company_config.find_one({}, {"_id": 0})
+
+    async def set_company_logo(self, logo):
+        await self.db.company_config.update_one({}, {"$set": {"logo": logo}})
+
+    async def insert_client(self, client):
+        await self.db.clients.insert_one(dict(client))
+
+    async def list_clients(self, limit=1000):
+        return await self.db.clients.find({}, {"_id": 0}).to_list(limit)
+
+    async def get_client(self, client_id):
+        return await self.db.clients.find_one({"id": client_id}, {"_id": 0})
+
+    async def take_note_number(self, client_id):
+        client = await self.db.clients.find_one_and_update(
+            {"id": client_id},
+            {"$inc": {"last_note_number": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+        if not client:
+            return None
+        return client, client.get("last_note_number", 0) + 1
+
+    async def insert_note(self, note):
+        await self.db.delivery_notes.insert_one(encode_note(note))
+        await self.update_catalog(catalog_deltas(note["products"]))
+
+    async def update_catalog(self, deltas):
+        if deltas:
+            await self.db[CATALOG_COLLECTION].bulk_write(mongo_catalog_updates(deltas), ordered=False)
+
+    async def find_note(self, note_id):
+        """Look a note up in the hot collection first, then in the archive"""
+        for collection in (self.db.delivery_notes, self.archived_notes):
+            note = await collection.find_one(note_filter(note_id))
+            if note:
+                return collection, note
+        return None, None
+
+    async def list_notes(self, limit=1000):
+        notes = await self.db.delivery_notes.find().sort("created_at", -1).to_list(limit)
+        # Archived notes are all older than the hot ones, so they only fill the tail
+        if len(notes) < limit:
+            notes += await self.archived_notes.find().sort("created_at", -1).to_list(limit - len(notes))
+        return [decode_note(note) for note in notes]
+
+    async def get_note(self, note_id):
+        _, note = await self.find_note(note_id)
+        return decode_note(note) if note else None
+
+    async def update_note(self, note_id, fields):
+        fields = dict(fields)
+        if "client_info" in fields:
+            fields["client_info"] = encode_client_snapshot(fields["client_info"])
+        while True:
+            collection, note = await self.find_note(note_id)
+            if not note:
+                return None
+            previous = await collection.find_one_and_update(
+                {"_id": note["_id"]},
+                {"$set": fields},
+                return_document=ReturnDocument.BEFORE,
+            )
+            # A miss means the note was archived or migrated since find_note: look it up again
+            if previous:
+                break
+        if "products" in fields:
+            await self.update_catalog(catalog_deltas(fields["products"], previous.get("products", [])))
+        return decode_note({**previous, **fields})
+
+    async def delete_note(self, note_id):
+        while True:
+            collection, note = await self.find_note(note_id)
+            if not note:
+                return False
+            deleted = await collection.find_one_and_delete({"_id": note["_id"]})
+            # A miss means the note was archived or migrated since find_note: look it up again
+            if deleted:
+                break
+        await self.update_catalog(catalog_deltas([], deleted.get("products", [])))
+        return True
+
+    async def statistics(self):
+        total_notes = await self.db.delivery_notes.count_documents({}) + await self.archived_notes.count_documents({})
+        total_clients = await self.db.clients.count_documents({})
+
+        # Get notes by client, including archived ones
+        pipeline = [
+            {"$unionWith": ARCHIVE_COLLECTION},
+            {"$group": {"_id": "$client_info.name", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}}
+        ]
+        notes_by_client = await self.db.delivery_notes.aggregate(pipeline).to_list(None)
+        return {
+            "total_notes": total_notes,
+            "total_clients": total_clients,
+            "notes_by_client": notes_by_client
+        }
+
+    async def count_notes(self):
+        return await self.db.delivery_notes.count_documents({}) + await self.archived_notes.count_documents({})
+
+    async def iter_notes(self, batch_size=1000):
+        for collection in (self.archived_notes, self.db.delivery_notes):
+            batch = []
+            async for note in collection.find().sort("created_at", 1).batch_size(batch_size):
+                batch.append(decode_note(note))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+    async def archive_notes(self, older_than_days, progress=None):
+        """Only Mongo keeps an archive collection, see archive.py"""
+        return await archive_old_notes(self.db, older_than_days, progress=progress)
+
+    async def autocomplete_products(self, prefix, limit=10):
+        # An anchored regex on _id is answered from the _id index
+        query = {"_id": {"$regex": "^" + re.escape(product_key(prefix))}, "line_count": {"$gt": 0}}
+        cursor = self.db[CATALOG_COLLECTION].find(query).sort("line_count", -1).limit(limit)
+        return [{"key": entry.pop("_id"), **entry} async for entry in cursor]
+
+    async def list_products(self, limit=1000):
+        cursor = self.db[CATALOG_COLLECTION].find({"line_count": {"$gt": 0}}).sort("_id", 1).limit(limit)
+        return [{"key": entry.pop("_id"), **entry} async for entry in cursor]
+
+    async def rebuild_product_catalog(self, progress=None):
+        return await rebuild_mongo_catalog(self.db, progress)
+
+    async def reserve_idempotency_key(self, key, fingerprint):
+        now = datetime.now(timezone.utc)
+        record = {"_id": key, "fingerprint": fingerprint, "status_code": None, "created_at": now}
+        while True:
+            try:
+                await self.db.idempotency_keys.insert_one(record)
+                return None
+            except DuplicateKeyError:
+                # Take over a reservation whose request never finished
+                taken = await self.db.idempotency_keys.find_one_and_update(
+                    {
+                        "_id": key,
+                        "status_code": None,
+                        "created_at": {"$lt": now - timedelta(seconds=IDEMPOTENCY_LEASE_SECONDS)},
+                    },
+                    {"$set": {"fingerprint": fingerprint, "created_at": now}},
+                )
+                if taken:
+                    return None
+                existing = await self.db.idempotency_keys.find_one({"_id": key}, {"_id": 0, "created_at": 0})
+                # Gone between the insert and the read (expired or released): claim it again
+                if existing:
+                    return existing
+
+    async def complete_idempotency_key(self, key, status_code, content_type, body):
+        await self.db.idempotency_keys.update_one(
+            {"_id": key},
+            {"$set": {"status_code": status_code, "content_type": content_type, "body": body}}
+        )
+
+    async def release_idempotency_key(self, key):
+        await self.db.idempotency_keys.delete_one({"_id": key, "status_code": None})
+
+    async def insert_job(self, job):
+        await self.db.jobs.insert_one(dict(job))
+
+    async def get_job(self, job_id):
+        return await self.db.jobs.find_one({"id": job_id}, {"_id": 0})
+
+    async def list_jobs(self, limit=100):
+        return await self.db.jobs.find({}, {"_id": 0}).sort("created_at", -1).to_list(limit)
+
+    async def claim_job(self, worker):
+        now = datetime.now(timezone.utc)
+        job = await self.db.jobs.find_one_and_update(
+            {"status": "queued"},
+            {
+                "$set": {"status": "running", "worker": worker, "started_at": now, "heartbeat_at": now},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job:
+            del job["_id"]
+        return job
+
+    async def update_job(self, job_id, fields):
+        return await self.db.jobs.find_one_and_update(
+            {"id": job_id}, {"$set": fields}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+
+    async def request_job_cancel(self, job_id):
+        now = datetime.now(timezone.utc)
+        for status, fields in (
+            ("queued", {"status": "cancelled", "cancel_requested": True, "finished_at": now}),
+            ("running", {"cancel_requested": True}),
+        ):
+            job = await self.db.jobs.find_one_and_update(
+                {"id": job_id, "status": status}, {"$set": fields}, return_document=ReturnDocument.AFTER
+            )
+            if job:
+                del job["_id"]
+                return job
+        return await self.get_job(job_id)
+
+    async def requeue_stale_jobs(self, heartbeat_before, max_attempts):
+        now = datetime.now(timezone.utc)
+        stale = {"status": "running", "heartbeat_at": {"$lt": heartbeat_before}}
+        await self.db.jobs.update_many(
+            {**stale, "cancel_requested": True}, {"$set": {"status": "cancelled", "finished_at": now}}
+        )
+        await self.db.jobs.update_many(
+            {**stale, "attempts": {"$gte": max_attempts}},
+            {"$set": {"status": "failed", "error": "Trabajo interrumpido demasiadas veces", "finished_at": now}},
+        )
+        result = await self.db.jobs.update_many(
+            stale, {"$set": {"status": "queued", "progress": 0.0, "message": "", "worker": None}}
+        )
+        return result.modified_count
+
+    async def ping(self):
+        await self.db.command("ping")
+
+    async def ensure_indexes(self):
+        await self.db.clients.create_index("id")
+        await self.db.delivery_notes.create_index([("created_at", -1)])
+        # Only notes still in the legacy layout carry a string id
+        await self.db.delivery_notes.create_index("id", sparse=True)
+        await self.db.jobs.create_index("id", unique=True)
+        await self.db.jobs.create_index([("status", 1), ("created_at", 1)])
+        try:
+            await self.db.idempotency_keys.create_index("created_at", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS)
+        except OperationFailure:
+            # The TTL changed since the index was created
+            await self.db.command(
+                "collMod", "idempotency_keys",
+                index={"keyPattern": {"created_at": 1}, "expireAfterSeconds": IDEMPOTENCY_TTL_SECONDS},
+            )
+
+    async def close(self):
+        self.client.close()
+
+
+def create_repository() -> Repository:
+    backend = os.environ.get('STORAGE_BACKEND', 'mongo').lower()
+    if backend == 'mongo':
+        return MongoRepository(os.environ['MONGO_URL'], os.environ['DB_NAME'], **mongo_pool_options())
+    if backend == 'sqlite':
+        from sqlite_repository import SQLiteRepository
+        return SQLiteRepository(os.environ.get('SQLITE_PATH', str(ROOT_DIR / 'notas.db')))
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
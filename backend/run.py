@@ -0,0 +1,150 @@
+"""Production launcher: N uvicorn workers sharing one listening socket.
+
+    python run.py --workers 8 --total-pool-size 200
+
+Each worker opens its own storage pool in the app lifespan and only starts
+accepting connections once it is warmed up. The Mongo pool is split across
+workers (``--total-pool-size``) unless MONGO_MAX_POOL_SIZE is set. Send
+SIGHUP for a rolling restart: workers are replaced one at a time and an old
+worker is only stopped once its replacement is ready, so there is always
+warm capacity. SIGINT/SIGTERM shut every worker down gracefully.
+"""
+import math
+import multiprocessing
+import os
+import signal
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+import uvicorn
+from dotenv import load_dotenv
+
+# Loaded before the pool split below, so MONGO_MAX_POOL_SIZE from .env takes precedence
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+cli = typer.Typer(help="Lanza el servidor con varios workers")
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def serve_worker(config: uvicorn.Config, sockets, started):
+    """Worker process: serve on the inherited sockets and report once warmed up"""
+    # SIGHUP is meant for the supervisor; don't let it kill workers sharing its process group
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    server = uvicorn.Server(config)
+    original_startup = server.startup
+
+    async def startup(sockets=None):
+        # Runs the app lifespan (pool + warm-up) before accepting connections
+        await original_startup(sockets=sockets)
+        if server.started:
+            started.set()
+
+    server.startup = startup
+    server.run(sockets=sockets)
+
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int, ready_timeout: float):
+        self.config = config
+        self.workers = workers
+        self.ready_timeout = ready_timeout
+        self.sockets = [config.bind_socket()]
+        self.processes: List[multiprocessing.Process] = []
+        self.should_exit = threading.Event()
+        self.should_restart = threading.Event()
+
+    def spawn_worker(self) -> Optional[multiprocessing.Process]:
+        started = spawn.Event()
+        process = spawn.Process(target=serve_worker, args=(self.config, self.sockets, started))
+        process.start()
+        if not started.wait(self.ready_timeout):
+            typer.echo(f"⚠️  worker {process.pid} did not become ready in {self.ready_timeout}s", err=True)
+            process.terminate()
+            process.join()
+            return None
+        typer.echo(f"✅ worker {process.pid} ready")
+        return process
+
+    def stop_worker(self, process: multiprocessing.Process):
+        process.terminate()  # SIGTERM: uvicorn finishes in-flight requests, then runs lifespan shutdown
+        process.join(self.config.timeout_graceful_shutdown or 30)
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+    def rolling_restart(self):
+        for index, old in enumerate(list(self.processes)):
+            new = self.spawn_worker()
+            if new is None:
+                typer.echo("❌ rolling restart aborted, keeping the remaining old workers", err=True)
+                return
+            self.processes[index] = new
+            self.stop_worker(old)
+
+    def run(self):
+        for sig, handler in (
+            (signal.SIGINT, lambda *_: self.should_exit.set()),
+            (signal.SIGTERM, lambda *_: self.should_exit.set()),
+            (signal.SIGHUP, lambda *_: self.should_restart.set()),
+        ):
+            signal.signal(sig, handler)
+
+        for _ in range(self.workers):
+            process = self.spawn_worker()
+            if process is None:
+                raise typer.Exit(1)
+            self.processes.append(process)
+        typer.echo(f"🚀 {self.workers} workers listening on {self.config.host}:{self.config.port}")
+
+        while not self.should_exit.wait(1):
+            if self.should_restart.is_set():
+                self.should_restart.clear()
+                typer.echo("🔁 rolling restart")
+                self.rolling_restart()
+            # Replace workers that died unexpectedly
+            for index, process in enumerate(self.processes):
+                if not process.is_alive() and not self.should_exit.is_set():
+                    typer.echo(f"⚠️  worker {process.pid} exited with {process.exitcode}, replacing it", err=True)
+                    self.processes[index] = self.spawn_worker() or process
+
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            self.stop_worker(process)
+        for sock in self.sockets:
+            sock.close()
+
+
+@cli.command()
+def main(
+    host: str = typer.Option("0.0.0.0"),
+    port: int = typer.Option(8001),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Worker processes (default: one per core)"),
+    total_pool_size: int = typer.Option(
+        100, help="Mongo connections shared by all workers; each gets total / workers"
+    ),
+    ready_timeout: float = typer.Option(60.0, help="Seconds a worker may take to start and warm up"),
+    graceful_timeout: int = typer.Option(30, help="Seconds to let in-flight requests finish on shutdown"),
+):
+    if workers < 1:
+        raise typer.BadParameter("workers debe ser al menos 1")
+    # Inherited by the spawned workers
+    os.environ.setdefault("MONGO_MAX_POOL_SIZE", str(max(1, math.ceil(total_pool_size / workers))))
+
+    config = uvicorn.Config(
+        "server:app",
+        host=host,
+        port=port,
+        lifespan="on",
+        proxy_headers=True,
+        timeout_graceful_shutdown=graceful_timeout,
+    )
+    Supervisor(config, workers, ready_timeout).run()
+
+
+if __name__ == "__main__":
+    cli()
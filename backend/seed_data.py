@@ -0,0 +1,214 @@
+"""Bulk-load synthetic clients and delivery notes for scale testing.
+
+    python seed_data.py --clients 50000 --notes 5000000 --drop
+
+Documents are shaped exactly like the ones the API writes (``Client`` dumps
+and compact-encoded ``DeliveryNote`` dumps) so every endpoint works against
+the seeded data.
+"""
+import asyncio
+import itertools
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import typer
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from note_schema import encode_note
+from server import Client, DeliveryNote
+
+cli = typer.Typer(help="Genera clientes y notas de entrega sintéticos")
+
+CITIES = ["Caracas", "Valencia", "Maracaibo", "Barquisimeto", "Maracay", "Puerto La Cruz", "Mérida"]
+COMPANY_WORDS = ["INVERSIONES", "DISTRIBUIDORA", "COMERCIAL", "INDUSTRIAS", "QUIMICOS", "SUMINISTROS", "PLASTICOS"]
+PAYMENT_CONDITIONS = ["Contado", "Crédito", "Crédito 15 días", "Crédito 30 días"]
+FIRST_NAMES = ["Juan", "María", "José", "Carmen", "Luis", "Ana", "Carlos", "Rosa", "Pedro", "Luisa"]
+LAST_NAMES = ["Pérez", "González", "Rodríguez", "Hernández", "García", "Martínez", "López", "Díaz"]
+TRANSPORTS = ["Transporte Terrestre", "Transporte Propio", "Retira el Cliente", ""]
+PRODUCT_FAMILIES = ["RESINA", "TITANIO", "CARBONATO", "PIGMENTO", "SOLVENTE", "CATALIZADOR", "ADITIVO", "FIBRA"]
+# (package_unit, sale_unit, sale quantity per package)
+PACKAGINGS = [("TAM", "Kg", 200), ("SAC", "Kg", 25), ("GAL", "Lt", 4), ("CAJ", "Und", 12), ("UND", "Und", 1)]
+
+
+def zipf_cum_weights(size: int, exponent: float) -> List[float]:
+    """Cumulative Zipf weights so that a few items dominate, like real customers and products"""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, size + 1)))
+
+
+def build_clients(count: int, rng: random.Random, now: datetime) -> List[Dict]:
+    clients = []
+    for i in range(count):
+        prefix = rng.choice(["J", "J", "J", "V", "G"])
+        clients.append({
+            "id": str(uuid.uuid4()),
+            "name": f"{rng.choice(COMPANY_WORDS)} {rng.choice(LAST_NAMES).upper()} {i} C.A.",
+            "rif_ci": f"{prefix}-{400000000 + i}",
+            "address": f"Calle {rng.randint(1, 120)}, {rng.choice(CITIES)}",
+            "payment_condition": rng.choice(PAYMENT_CONDITIONS),
+            "last_note_number": 0,
+            "created_at": now - timedelta(days=rng.randint(365, 3 * 365)),
+        })
+    Client.model_validate(clients[0])
+    return clients
+
+
+def build_products(count: int, rng: random.Random) -> List[Dict]:
+    products = []
+    for i in range(count):
+        package_unit, sale_unit, per_package = rng.choice(PACKAGINGS)
+        products.append({
+            "description": f"{rng.choice(PRODUCT_FAMILIES)} {rng.choice(['KIMIX', 'PREFLEX', 'ULTRA', 'MAX'])} R{i:04d}",
+            "package_unit": package_unit,
+            "sale_unit": sale_unit,
+            "per_package": per_package,
+        })
+    return products
+
+
+class NoteGenerator:
+    """Produces note batches and tracks each client's running note number"""
+
+    def __init__(self, clients: List[Dict], products: List[Dict], skew: float, days: int, seed: int):
+        self.clients = clients
+        self.products = products
+        self.client_weights = zipf_cum_weights(len(clients), skew)
+        self.product_weights = zipf_cum_weights(len(products), skew)
+        self.days = days
+        self.rng = random.Random(seed)
+        self.now = datetime.now(timezone.utc)
+        self.last_numbers = [0] * len(clients)
+
+    def product_lines(self) -> List[Dict]:
+        lines = []
+        picked = self.rng.choices(self.products, cum_weights=self.product_weights, k=self.rng.randint(1, 5))
+        for product in picked:
+            package_quantity = self.rng.randint(1, 40)
+            lines.append({
+                "description": product["description"],
+                "package_unit": product["package_unit"],
+                "package_quantity": package_quantity,
+                "sale_unit": product["sale_unit"],
+                "sale_quantity": package_quantity * product["per_package"],
+            })
+        return lines
+
+    def batch(self, size: int) -> List[Dict]:
+        notes = []
+        indexes = self.rng.choices(range(len(self.clients)), cum_weights=self.client_weights, k=size)
+        for index in indexes:
+            client = self.clients[index]
+            number = self.last_numbers[index] + 1
+            self.last_numbers[index] = number
+            issue_date = self.now - timedelta(seconds=self.rng.randint(0, self.days * 86400))
+            received = self.rng.random() < 0.7
+            notes.append({
+                "id": str(uuid.uuid4()),
+                "note_number": f"{client['rif_ci']}-{number:03d}",
+                "issue_date": issue_date,
+                "client_id": client["id"],
+                # Snapshot of the client as it was when the note was issued
+                "client_info": {**client, "last_note_number": number - 1},
+                "delivery_location": {
+                    "address": client["address"],
+                    "contact_person": f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}",
+                    "phone": f"04{self.rng.choice(['12', '14', '16', '24', '26'])}-{self.rng.randint(1000000, 9999999)}",
+                },
+                "products": self.product_lines(),
+                "transport": self.rng.choice(TRANSPORTS),
+                "received_by_name": f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}" if received else "",
+                "received_by_cedula": f"V-{self.rng.randint(5000000, 30000000)}" if received else "",
+                "received_date": issue_date + timedelta(days=self.rng.randint(0, 3)) if received else None,
+                "created_at": issue_date,
+            })
+        DeliveryNote.model_validate(notes[0])
+        return notes
+
+
+async def insert_batches(collection, batches, concurrency: int, total: int, label: str):
+    """Insert batches with up to `concurrency` unordered insert_many calls in flight"""
+    pending = set()
+    inserted = 0
+    started = time.perf_counter()
+    for batch in batches:
+        if len(pending) >= concurrency:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                inserted += len(task.result().inserted_ids)
+            rate = inserted / (time.perf_counter() - started)
+            typer.echo(f"\r   {label}: {inserted}/{total} ({rate:,.0f}/s)", nl=False)
+        pending.add(asyncio.create_task(collection.insert_many(batch, ordered=False)))
+    for task in asyncio.as_completed(pending):
+        inserted += len((await task).inserted_ids)
+    typer.echo(f"\r   {label}: {inserted}/{total} in {time.perf_counter() - started:.1f}s")
+
+
+async def seed(mongo_url: str, db_name: str, clients_count: int, notes_count: int, products_count: int,
+               batch_size: int, concurrency: int, skew: float, days: int, seed_value: int, drop: bool):
+    mongo = AsyncIOMotorClient(mongo_url, maxPoolSize=max(concurrency, 10))
+    db = mongo[db_name]
+    try:
+        if drop:
+            typer.echo("🧹 Dropping clients and delivery_notes")
+            await db.clients.drop()
+            await db.delivery_notes.drop()
+
+        rng = random.Random(seed_value)
+        now = datetime.now(timezone.utc)
+        clients = build_clients(clients_count, rng, now)
+        products = build_products(products_count, rng)
+
+        typer.echo(f"🚀 Seeding {clients_count} clients, {notes_count} notes, {products_count} products")
+        client_batches = (clients[i:i + batch_size] for i in range(0, len(clients), batch_size))
+        # insert_many adds _id to each dict; copy so note snapshots stay clean
+        await insert_batches(db.clients, ([dict(c) for c in b] for b in client_batches),
+                             concurrency, clients_count, "clients")
+
+        generator = NoteGenerator(clients, products, skew, days, seed_value + 1)
+        sizes = [batch_size] * (notes_count // batch_size)
+        if notes_count % batch_size:
+            sizes.append(notes_count % batch_size)
+        await insert_batches(db.delivery_notes, ([encode_note(n) for n in generator.batch(size)] for size in sizes),
+                             concurrency, notes_count, "delivery_notes")
+
+        # Keep the counters in line with the notes so new notes continue the sequence
+        updates = [
+            UpdateOne({"id": client["id"]}, {"$set": {"last_note_number": number}})
+            for client, number in zip(clients, generator.last_numbers) if number
+        ]
+        for i in range(0, len(updates), batch_size):
+            await db.clients.bulk_write(updates[i:i + batch_size], ordered=False)
+        typer.echo(f"✅ Updated note counters for {len(updates)} clients")
+        typer.echo("   Run `python catalog.py` to rebuild the product catalog from the new notes")
+    finally:
+        mongo.close()
+
+
+@cli.command()
+def main(
+    clients: int = typer.Option(1000, help="Number of clients to create"),
+    notes: int = typer.Option(100000, help="Number of delivery notes to create"),
+    products: int = typer.Option(500, help="Size of the product catalog notes draw from"),
+    batch_size: int = typer.Option(5000, help="Documents per insert_many call"),
+    concurrency: int = typer.Option(8, help="Parallel insert_many calls in flight"),
+    skew: float = typer.Option(1.1, help="Zipf exponent for client/product popularity (0 = uniform)"),
+    days: int = typer.Option(730, help="Spread issue dates over this many past days"),
+    seed_value: int = typer.Option(42, "--seed", help="Random seed for reproducible datasets"),
+    drop: bool = typer.Option(False, help="Drop clients and delivery_notes before seeding"),
+    mongo_url: Optional[str] = typer.Option(None, help="Defaults to MONGO_URL from .env"),
+    db_name: Optional[str] = typer.Option(None, help="Defaults to DB_NAME from .env"),
+):
+    if clients < 1 or notes < 0 or products < 1 or batch_size < 1 or concurrency < 1:
+        raise typer.BadParameter("clients, products, batch-size y concurrency deben ser positivos")
+    asyncio.run(seed(
+        mongo_url or os.environ["MONGO_URL"], db_name or os.environ["DB_NAME"],
+        clients, notes, products, batch_size, concurrency, skew, days, seed_value, drop,
+    ))
+
+
+if __name__ == "__main__":
+    cli()
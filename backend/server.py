@@ -1,26 +1,76 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query, Response
+from fastapi.responses import FileResponse
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import uuid
 from datetime import datetime, timezone
 import base64
 
+from admission import limiter
+from coalesce import SingleFlight
+from idempotency import IdempotencyMiddleware
+from jobs import HANDLERS, JobRunner, job_supported, new_job
+from repository import Repository, create_repository
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Storage backend (MongoDB by default, see repository.py), opened in lifespan()
+repo: Optional[Repository] = None
+ready = False
+
+# Background job workers for long-running operations (see jobs.py), started in lifespan()
+jobs: Optional[JobRunner] = None
+
+# Concurrent identical reads share one query; READ_CACHE_TTL_SECONDS > 0 also caches the result
+reads = SingleFlight(ttl=float(os.environ.get('READ_CACHE_TTL_SECONDS', '0')))
+
+# Bounded concurrency for expensive queries (see admission.py for configuration)
+list_notes_limiter = limiter("delivery-notes", 4)
+statistics_limiter = limiter("statistics", 2)
+clients_limiter = limiter("clients", 4)
+products_limiter = limiter("products", 4)
+autocomplete_limiter = limiter("autocomplete", 8)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global repo, ready, jobs
+    repo = create_repository()
+    # Fail fast if the database is unreachable, and open the pool before serving
+    await repo.ping()
+    await repo.ensure_indexes()
+    if os.environ.get('WARMUP_ON_STARTUP', 'true').lower() == 'true':
+        # Pull the hot reads into the database cache (and the read cache, if enabled)
+        await get_company_config()
+        await get_delivery_notes()
+    jobs = JobRunner(repo)
+    await jobs.start()
+    ready = True
+    logger.info("Storage ready (%s)", type(repo).__name__)
+    try:
+        yield
+    finally:
+        # Report not-ready first so load balancers stop routing here while we drain
+        ready = False
+        # Running jobs go back to the queue and resume after the restart
+        await jobs.stop()
+        await repo.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -88,23 +138,52 @@ class DeliveryNoteCreate(BaseModel):
     products: List[Product]
     transport: Optional[str] = ""
 
+class CatalogProduct(BaseModel):
+    key: str
+    description: str
+    package_unit: str
+    sale_unit: str
+    line_count: int
+    total_package_quantity: int
+    total_sale_quantity: int
+
+class Job(BaseModel):
+    id: str
+    type: str
+    params: Dict[str, Any]
+    status: str
+    progress: float
+    message: str = ""
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    cancel_requested: bool = False
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class JobCreate(BaseModel):
+    type: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+
 # Company Configuration Routes
 @api_router.post("/company-config", response_model=CompanyConfig)
 async def create_company_config(config: CompanyConfigCreate):
-    # Delete existing config (only one company config allowed)
-    await db.company_config.delete_many({})
-    
     config_dict = config.dict()
     config_obj = CompanyConfig(**config_dict)
-    await db.company_config.insert_one(config_obj.dict())
+    # Replaces the existing config (only one company config allowed)
+    await repo.replace_company_config(config_obj.dict())
+    reads.forget("company-config")
     return config_obj
 
 @api_router.get("/company-config", response_model=Optional[CompanyConfig])
 async def get_company_config():
-    config = await db.company_config.find_one()
-    if config:
-        return CompanyConfig(**config)
-    return None
+    async def load():
+        config = await repo.get_company_config()
+        if config:
+            return CompanyConfig(**config)
+        return None
+    return await reads.do("company-config", load)
 
 @api_router.post("/company-config/logo")
 async def upload_logo(file: UploadFile = File(...)):
@@ -116,10 +195,8 @@ async def upload_logo(file: UploadFile = File(...)):
     logo_data_url = f"data:{file.content_type};base64,{encoded_logo}"
     
     # Update company config with logo
-    await db.company_config.update_one(
-        {},
-        {"$set": {"logo": logo_data_url}}
-    )
+    await repo.set_company_logo(logo_data_url)
+    reads.forget("company-config")
     
     return {"message": "Logo subido exitosamente", "logo": logo_data_url}
 
@@ -128,17 +205,19 @@ async def upload_logo(file: UploadFile = File(...)):
 async def create_client(client: ClientCreate):
     client_dict = client.dict()
     client_obj = Client(**client_dict)
-    await db.clients.insert_one(client_obj.dict())
+    await repo.insert_client(client_obj.dict())
+    reads.forget("statistics")
     return client_obj
 
 @api_router.get("/clients", response_model=List[Client])
 async def get_clients():
-    clients = await db.clients.find().to_list(1000)
+    async with clients_limiter:
+        clients = await repo.list_clients(1000)
     return [Client(**client) for client in clients]
 
 @api_router.get("/clients/{client_id}", response_model=Client)
 async def get_client(client_id: str):
-    client = await db.clients.find_one({"id": client_id})
+    client = await repo.get_client(client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     return Client(**client)
@@ -146,23 +225,15 @@ async def get_client(client_id: str):
 # Delivery Notes Routes
 @api_router.post("/delivery-notes", response_model=DeliveryNote)
 async def create_delivery_note(note: DeliveryNoteCreate):
-    # Get client info
-    client = await db.clients.find_one({"id": note.client_id})
-    if not client:
+    # Get client info and reserve the next note number
+    reserved = await repo.take_note_number(note.client_id)
+    if not reserved:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     
+    client, new_note_number = reserved
     client_obj = Client(**client)
-    
-    # Generate note number
-    new_note_number = client_obj.last_note_number + 1
     note_number = f"{client_obj.rif_ci}-{new_note_number:03d}"
     
-    # Update client's last note number
-    await db.clients.update_one(
-        {"id": note.client_id},
-        {"$set": {"last_note_number": new_note_number}}
-    )
-    
     # Create delivery note
     note_dict = note.dict()
     note_dict["note_number"] = note_number
@@ -170,30 +241,34 @@ async def create_delivery_note(note: DeliveryNoteCreate):
     note_dict["client_info"] = client_obj.dict()
     
     delivery_note = DeliveryNote(**note_dict)
-    await db.delivery_notes.insert_one(delivery_note.dict())
+    await repo.insert_note(delivery_note.dict())
+    reads.forget("delivery-notes", "statistics")
     
     return delivery_note
 
 @api_router.get("/delivery-notes", response_model=List[DeliveryNote])
 async def get_delivery_notes():
-    notes = await db.delivery_notes.find().sort("created_at", -1).to_list(1000)
-    return [DeliveryNote(**note) for note in notes]
+    async def load():
+        async with list_notes_limiter:
+            notes = await repo.list_notes(1000)
+        return [DeliveryNote(**note) for note in notes]
+    return await reads.do("delivery-notes", load)
 
 @api_router.get("/delivery-notes/{note_id}", response_model=DeliveryNote)
 async def get_delivery_note(note_id: str):
-    note = await db.delivery_notes.find_one({"id": note_id})
+    note = await repo.get_note(note_id)
     if not note:
         raise HTTPException(status_code=404, detail="Nota de entrega no encontrada")
     return DeliveryNote(**note)
 
 @api_router.put("/delivery-notes/{note_id}", response_model=DeliveryNote)
 async def update_delivery_note(note_id: str, note_update: DeliveryNoteCreate):
-    existing_note = await db.delivery_notes.find_one({"id": note_id})
+    existing_note = await repo.get_note(note_id)
     if not existing_note:
         raise HTTPException(status_code=404, detail="Nota de entrega no encontrada")
     
     # Get client info
-    client = await db.clients.find_one({"id": note_update.client_id})
+    client = await repo.get_client(note_update.client_id)
     if not client:
         raise HTTPException(status_code=404, detail="Cliente no encontrado")
     
@@ -203,43 +278,107 @@ async def update_delivery_note(note_id: str, note_update: DeliveryNoteCreate):
     update_dict = note_update.dict()
     update_dict["client_info"] = client_obj.dict()
     
-    await db.delivery_notes.update_one(
-        {"id": note_id},
-        {"$set": update_dict}
-    )
-    
-    updated_note = await db.delivery_notes.find_one({"id": note_id})
+    updated_note = await repo.update_note(note_id, update_dict)
+    if not updated_note:
+        raise HTTPException(status_code=404, detail="Nota de entrega no encontrada")
+    reads.forget("delivery-notes", "statistics")
     return DeliveryNote(**updated_note)
 
 @api_router.delete("/delivery-notes/{note_id}")
 async def delete_delivery_note(note_id: str):
-    result = await db.delivery_notes.delete_one({"id": note_id})
-    if result.deleted_count == 0:
+    if not await repo.delete_note(note_id):
         raise HTTPException(status_code=404, detail="Nota de entrega no encontrada")
+    reads.forget("delivery-notes", "statistics")
     return {"message": "Nota de entrega eliminada exitosamente"}
 
+# Product Catalog Routes
+@api_router.get("/products", response_model=List[CatalogProduct])
+async def get_products():
+    async with products_limiter:
+        products = await repo.list_products(1000)
+    return [CatalogProduct(**product) for product in products]
+
+@api_router.get("/products/autocomplete", response_model=List[CatalogProduct])
+async def autocomplete_products(q: str = "", limit: int = Query(10, ge=1, le=50)):
+    async with autocomplete_limiter:
+        products = await repo.autocomplete_products(q, limit)
+    return [CatalogProduct(**product) for product in products]
+
 # Statistics Route
 @api_router.get("/statistics")
 async def get_statistics():
-    total_notes = await db.delivery_notes.count_documents({})
-    total_clients = await db.clients.count_documents({})
-    
-    # Get notes by client
-    pipeline = [
-        {"$group": {"_id": "$client_info.name", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}}
-    ]
-    notes_by_client = await db.delivery_notes.aggregate(pipeline).to_list(None)
-    
-    return {
-        "total_notes": total_notes,
-        "total_clients": total_clients,
-        "notes_by_client": notes_by_client
-    }
+    async def load():
+        async with statistics_limiter:
+            return await repo.statistics()
+    return await reads.do("statistics", load)
+
+# Background Job Routes
+@api_router.post("/jobs", response_model=Job, status_code=202)
+async def create_job(request: JobCreate):
+    if request.type not in HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Tipo de trabajo desconocido: {request.type}")
+    if not job_supported(request.type, repo):
+        raise HTTPException(
+            status_code=400, detail=f"El trabajo {request.type} no está disponible con este almacenamiento"
+        )
+    job = new_job(request.type, request.params)
+    await repo.insert_job(job)
+    jobs.notify()
+    return Job(**job)
+
+@api_router.get("/jobs", response_model=List[Job])
+async def get_jobs(limit: int = Query(100, ge=1, le=1000)):
+    return [Job(**job) for job in await repo.list_jobs(limit)]
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    job = await repo.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return Job(**job)
+
+@api_router.post("/jobs/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str):
+    job = await repo.request_job_cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return Job(**job)
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await repo.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    if job["status"] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"El trabajo no tiene resultado (estado: {job['status']})")
+    if job.get("result_file"):
+        path = Path(job["result_file"])
+        if not path.exists():
+            raise HTTPException(status_code=410, detail="El resultado ya no está disponible")
+        return FileResponse(path, media_type="text/csv", filename=f"{job['type']}-{job_id}{path.suffix}")
+    return job["result"]
+
+# Health Routes
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness(response: Response):
+    if ready:
+        try:
+            await repo.ping()
+            return {"status": "ready"}
+        except Exception:
+            logger.exception("Readiness ping failed")
+    response.status_code = 503
+    return {"status": "unavailable"}
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(IdempotencyMiddleware, get_store=lambda: repo)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -247,14 +386,3 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,555 @@
+"""Embedded SQLite storage engine for single-site deployments.
+
+Set ``STORAGE_BACKEND=sqlite`` (and optionally ``SQLITE_PATH``) to run the API
+without a MongoDB server. The database runs in WAL mode: writes go through
+one connection, one transaction at a time, while reads use a small pool of
+``SQLITE_READERS`` read-only connections, so readers are not blocked by the
+writer. Queries run in a worker thread so the event loop is never blocked on
+disk I/O.
+"""
+import asyncio
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict
+
+from catalog import TOTAL_FIELDS, catalog_corrections, catalog_deltas, merge_deltas, product_key
+from idempotency import IDEMPOTENCY_LEASE_SECONDS, IDEMPOTENCY_TTL_SECONDS
+from repository import Repository
+
+SQLITE_READERS = int(os.environ.get("SQLITE_READERS", "4"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS company_config (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    rif TEXT NOT NULL,
+    address TEXT NOT NULL,
+    phone TEXT NOT NULL,
+    logo TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clients (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    rif_ci TEXT NOT NULL,
+    address TEXT NOT NULL,
+    payment_condition TEXT NOT NULL,
+    last_note_number INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS delivery_notes (
+    id TEXT PRIMARY KEY,
+    note_number TEXT NOT NULL,
+    issue_date TEXT NOT NULL,
+    client_id TEXT NOT NULL,
+    client_name TEXT NOT NULL,
+    client_info TEXT NOT NULL,
+    delivery_location TEXT NOT NULL,
+    products TEXT NOT NULL,
+    transport TEXT,
+    received_by_name TEXT,
+    received_by_cedula TEXT,
+    received_date TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_delivery_notes_created_at ON delivery_notes (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_delivery_notes_client_id ON delivery_notes (client_id);
+CREATE INDEX IF NOT EXISTS idx_delivery_notes_client_name ON delivery_notes (client_name);
+CREATE TABLE IF NOT EXISTS product_catalog (
+    key TEXT PRIMARY KEY,
+    description TEXT NOT NULL,
+    package_unit TEXT NOT NULL,
+    sale_unit TEXT NOT NULL,
+    line_count INTEGER NOT NULL DEFAULT 0,
+    total_package_quantity INTEGER NOT NULL DEFAULT 0,
+    total_sale_quantity INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    status_code INTEGER,
+    content_type TEXT,
+    body BLOB,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at);
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    result_file TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    heartbeat_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created_at ON jobs (status, created_at);
+"""
+
+NOTE_JSON_FIELDS = ("client_info", "delivery_location", "products")
+NOTE_COLUMNS = (
+    "id", "note_number", "issue_date", "client_id", "client_name", "client_info", "delivery_location",
+    "products", "transport", "received_by_name", "received_by_cedula", "received_date", "created_at",
+)
+JOB_JSON_FIELDS = ("params", "result")
+
+
+def to_db(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def note_to_row(note: Dict) -> Dict:
+    row = {key: to_db(note.get(key)) for key in NOTE_COLUMNS if key not in NOTE_JSON_FIELDS}
+    for key in NOTE_JSON_FIELDS:
+        row[key] = json.dumps(note[key], default=json_default, ensure_ascii=False)
+    row["client_name"] = note["client_info"]["name"]
+    return row
+
+
+def apply_catalog_deltas(conn, deltas: Dict[str, Dict]):
+    now = datetime.now(timezone.utc).isoformat()
+    for key, delta in deltas.items():
+        if "description" in delta:
+            conn.execute(
+                "INSERT INTO product_catalog (key, description, package_unit, sale_unit, line_count, "
+                "total_package_quantity, total_sale_quantity, updated_at) "
+                "VALUES (:key, :description, :package_unit, :sale_unit, :line_count, "
+                ":total_package_quantity, :total_sale_quantity, :updated_at) "
+                "ON CONFLICT (key) DO UPDATE SET description = excluded.description, "
+                "package_unit = excluded.package_unit, sale_unit = excluded.sale_unit, "
+                "line_count = line_count + excluded.line_count, "
+                "total_package_quantity = total_package_quantity + excluded.total_package_quantity, "
+                "total_sale_quantity = total_sale_quantity + excluded.total_sale_quantity, "
+                "updated_at = excluded.updated_at",
+                {"key": key, "updated_at": now, **delta},
+            )
+        else:
+            conn.execute(
+                "UPDATE product_catalog SET line_count = line_count + :line_count, "
+                "total_package_quantity = total_package_quantity + :total_package_quantity, "
+                "total_sale_quantity = total_sale_quantity + :total_sale_quantity WHERE key = :key",
+                {"key": key, **delta},
+            )
+
+
+def row_to_note(row: sqlite3.Row) -> Dict:
+    note = dict(row)
+    del note["client_name"]
+    for key in NOTE_JSON_FIELDS:
+        note[key] = json.loads(note[key])
+    return note
+
+
+def job_to_row(job: Dict) -> Dict:
+    """Columns for a full job or just the fields being updated"""
+    row = {}
+    for key, value in job.items():
+        if key in JOB_JSON_FIELDS:
+            row[key] = json.dumps(value, default=json_default, ensure_ascii=False)
+        else:
+            row[key] = to_db(value)
+    return row
+
+
+def row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    for key in JOB_JSON_FIELDS:
+        job[key] = json.loads(job[key]) if job[key] is not None else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+class SQLiteRepository(Repository):
+    def __init__(self, path: str, readers: int = SQLITE_READERS):
+        self.conn = self.connect(path)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.reader_count = max(readers, 1)
+        self.readers = queue.SimpleQueue()
+        for _ in range(self.reader_count):
+            reader = self.connect(path)
+            reader.execute("PRAGMA query_only=ON")
+            self.readers.put(reader)
+
+    @staticmethod
+    def connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    async def run(self, fn, *args):
+        """Run fn(conn, *args) on the write connection in a worker thread, one statement batch at a time"""
+        def call():
+            with self.lock:
+                return fn(self.conn, *args)
+        return await asyncio.to_thread(call)
+
+    async def read(self, fn, *args):
+        """Run fn(conn, *args) on a pooled read-only connection in a worker thread"""
+        def call():
+            conn = self.readers.get()
+            try:
+                return fn(conn, *args)
+            finally:
+                self.readers.put(conn)
+        return await asyncio.to_thread(call)
+
+    @staticmethod
+    def insert(conn, table: str, values: Dict):
+        columns = ", ".join(values)
+        placeholders = ", ".join(f":{key}" for key in values)
+        conn.execute(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", values)
+
+    # Company config
+    async def replace_company_config(self, config):
+        def replace(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute("DELETE FROM company_config")
+                self.insert(conn, "company_config", {key: to_db(value) for key, value in config.items()})
+        await self.run(replace)
+
+    async def get_company_config(self):
+        def get(conn):
+            row = conn.execute("SELECT * FROM company_config LIMIT 1").fetchone()
+            return dict(row) if row else None
+        return await self.read(get)
+
+    async def set_company_logo(self, logo):
+        await self.run(lambda conn: conn.execute("UPDATE company_config SET logo = ?", (logo,)))
+
+    # Clients
+    async def insert_client(self, client):
+        await self.run(lambda conn: self.insert(conn, "clients", {key: to_db(value) for key, value in client.items()}))
+
+    async def list_clients(self, limit=1000):
+        def list_(conn):
+            return [dict(row) for row in conn.execute("SELECT * FROM clients LIMIT ?", (limit,))]
+        return await self.read(list_)
+
+    async def get_client(self, client_id):
+        def get(conn):
+            row = conn.execute("SELECT * FROM clients WHERE id = ?", (client_id,)).fetchone()
+            return dict(row) if row else None
+        return await self.read(get)
+
+    async def take_note_number(self, client_id):
+        def take(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT * FROM clients WHERE id = ?", (client_id,)).fetchone()
+                if not row:
+                    return None
+                conn.execute(
+                    "UPDATE clients SET last_note_number = last_note_number + 1 WHERE id = ?", (client_id,)
+                )
+                return dict(row), row["last_note_number"] + 1
+        return await self.run(take)
+
+    # Delivery notes
+    async def insert_note(self, note):
+        def insert(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                self.insert(conn, "delivery_notes", note_to_row(note))
+                apply_catalog_deltas(conn, catalog_deltas(note["products"]))
+        await self.run(insert)
+
+    async def list_notes(self, limit=1000):
+        def list_(conn):
+            rows = conn.execute("SELECT * FROM delivery_notes ORDER BY created_at DESC LIMIT ?", (limit,))
+            return [row_to_note(row) for row in rows]
+        return await self.read(list_)
+
+    async def get_note(self, note_id):
+        def get(conn):
+            row = conn.execute("SELECT * FROM delivery_notes WHERE id = ?", (note_id,)).fetchone()
+            return row_to_note(row) if row else None
+        return await self.read(get)
+
+    async def update_note(self, note_id, fields):
+        def update(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT * FROM delivery_notes WHERE id = ?", (note_id,)).fetchone()
+                if not row:
+                    return None
+                old_note = row_to_note(row)
+                note = {**old_note, **fields}
+                values = note_to_row(note)
+                assignments = ", ".join(f"{key} = :{key}" for key in values if key != "id")
+                conn.execute(f"UPDATE delivery_notes SET {assignments} WHERE id = :id", values)
+                apply_catalog_deltas(conn, catalog_deltas(note["products"], old_note["products"]))
+                return row_to_note(conn.execute("SELECT * FROM delivery_notes WHERE id = ?", (note_id,)).fetchone())
+        return await self.run(update)
+
+    async def delete_note(self, note_id):
+        def delete(conn):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT products FROM delivery_notes WHERE id = ?", (note_id,)).fetchone()
+                if not row:
+                    return False
+                conn.execute("DELETE FROM delivery_notes WHERE id = ?", (note_id,))
+                apply_catalog_deltas(conn, catalog_deltas([], json.loads(row["products"])))
+                return True
+        return await self.run(delete)
+
+    async def statistics(self):
+        def stats(conn):
+            notes_by_client = [
+                {"_id": row["client_name"], "count": row["count"]}
+                for row in conn.execute(
+                    "SELECT client_name, COUNT(*) AS count FROM delivery_notes "
+                    "GROUP BY client_name ORDER BY count DESC"
+                )
+            ]
+            return {
+                "total_notes": conn.execute("SELECT COUNT(*) FROM delivery_notes").fetchone()[0],
+                "total_clients": conn.execute("SELECT COUNT(*) FROM clients").fetchone()[0],
+                "notes_by_client": notes_by_client,
+            }
+        return await self.read(stats)
+
+    async def count_notes(self):
+        return await self.read(lambda conn: conn.execute("SELECT COUNT(*) FROM delivery_notes").fetchone()[0])
+
+    async def iter_notes(self, batch_size=1000):
+        def page(conn, after):
+            rows = conn.execute(
+                "SELECT * FROM delivery_notes WHERE (created_at, id) > (?, ?) ORDER BY created_at, id LIMIT ?",
+                (*after, batch_size),
+            )
+            return [row_to_note(row) for row in rows]
+
+        after = ("", "")
+        while True:
+            notes = await self.read(page, after)
+            if not notes:
+                return
+            yield notes
+            after = (notes[-1]["created_at"], notes[-1]["id"])
+
+    # Product catalog
+    async def autocomplete_products(self, prefix, limit=10):
+        key = product_key(prefix)
+
+        def autocomplete(conn):
+            rows = conn.execute(
+                "SELECT * FROM product_catalog WHERE key >= ? AND key < ? AND line_count > 0 "
+                "ORDER BY line_count DESC LIMIT ?",
+                (key, key + "\U0010ffff", limit),
+            )
+            return [dict(row) for row in rows]
+        return await self.read(autocomplete)
+
+    async def list_products(self, limit=1000):
+        def list_(conn):
+            rows = conn.execute("SELECT * FROM product_catalog WHERE line_count > 0 ORDER BY key LIMIT ?", (limit,))
+            return [dict(row) for row in rows]
+        return await self.read(list_)
+
+    async def rebuild_product_catalog(self, progress=None, batch_size=1000):
+        """Scan in pages inside one read transaction on a pooled read-only connection.
+
+        The live totals and the notes are read from the same snapshot, which in
+        WAL mode neither waits for nor blocks writers, so their difference is
+        exactly the drift. It is applied in one short write transaction, on top
+        of whatever was written since the snapshot.
+        """
+        def snapshot(conn):
+            conn.execute("BEGIN")
+            live = {row["key"]: dict(row) for row in conn.execute(
+                f"SELECT key, {', '.join(TOTAL_FIELDS)} FROM product_catalog"
+            )}
+            total = conn.execute("SELECT COUNT(*) FROM delivery_notes").fetchone()[0]
+            return live, total, conn.execute("SELECT products FROM delivery_notes ORDER BY created_at, id")
+
+        def apply(conn, corrections):
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                apply_catalog_deltas(conn, corrections)
+                conn.execute("DELETE FROM product_catalog WHERE line_count <= 0")
+
+        reader = await asyncio.to_thread(self.readers.get)
+        try:
+            live, total, cursor = await asyncio.to_thread(snapshot, reader)
+            entries: Dict[str, Dict] = {}
+            scanned = 0
+            while True:
+                rows = await asyncio.to_thread(cursor.fetchmany, batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    merge_deltas(entries, catalog_deltas(json.loads(row["products"])))
+                scanned += len(rows)
+                if progress:
+                    await progress(scanned, total)
+        finally:
+            if reader.in_transaction:
+                await asyncio.to_thread(reader.execute, "ROLLBACK")
+            self.readers.put(reader)
+
+        await self.run(apply, catalog_corrections(entries, live))
+        if progress and not scanned:
+            await progress(scanned, total)
+        return len(entries)
+
+    # Idempotency keys
+    async def reserve_idempotency_key(self, key, fingerprint):
+        def reserve(conn):
+            now = time.time()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                # Expire old keys here, SQLite has no TTL indexes
+                conn.execute("DELETE FROM idempotency_keys WHERE created_at < ?", (now - IDEMPOTENCY_TTL_SECONDS,))
+                row = conn.execute(
+                    "SELECT fingerprint, status_code, content_type, body, created_at FROM idempotency_keys "
+                    "WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row["status_code"] is None and row["created_at"] < now - IDEMPOTENCY_LEASE_SECONDS:
+                    # Take over a reservation whose request never finished
+                    conn.execute(
+                        "UPDATE idempotency_keys SET fingerprint = ?, created_at = ? WHERE key = ?",
+                        (fingerprint, now, key),
+                    )
+                    return None
+                if row:
+                    record = dict(row)
+                    del record["created_at"]
+                    return record
+                conn.execute(
+                    "INSERT INTO idempotency_keys (key, fingerprint, created_at) VALUES (?, ?, ?)",
+                    (key, fingerprint, now),
+                )
+                return None
+        return await self.run(reserve)
+
+    async def complete_idempotency_key(self, key, status_code, content_type, body):
+        await self.run(lambda conn: conn.execute(
+            "UPDATE idempotency_keys SET status_code = ?, content_type = ?, body = ? WHERE key = ?",
+            (status_code, content_type, body, key),
+        ))
+
+    async def release_idempotency_key(self, key):
+        await self.run(lambda conn: conn.execute(
+            "DELETE FROM idempotency_keys WHERE key = ? AND status_code IS NULL", (key,)
+        ))
+
+    # Background jobs
+    async def insert_job(self, job):
+        await self.run(lambda conn: self.insert(conn, "jobs", job_to_row(job)))
+
+    async def get_job(self, job_id):
+        def get(conn):
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return row_to_job(row) if row else None
+        return await self.read(get)
+
+    async def list_jobs(self, limit=100):
+        def list_(conn):
+            rows = conn.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+            return [row_to_job(row) for row in rows]
+        return await self.read(list_)
+
+    async def claim_job(self, worker):
+        def claim(conn):
+            now = datetime.now(timezone.utc).isoformat()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if not row:
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?, "
+                    "attempts = attempts + 1 WHERE id = ?",
+                    (worker, now, now, row["id"]),
+                )
+                return row_to_job(conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+        return await self.run(claim)
+
+    async def update_job(self, job_id, fields):
+        def update(conn):
+            values = job_to_row(fields)
+            assignments = ", ".join(f"{key} = :{key}" for key in values)
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(f"UPDATE jobs SET {assignments} WHERE id = :job_id", {**values, "job_id": job_id})
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                return row_to_job(row) if row else None
+        return await self.run(update)
+
+    async def request_job_cancel(self, job_id):
+        def cancel(conn):
+            now = datetime.now(timezone.utc).isoformat()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (now, job_id),
+                )
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                return row_to_job(row) if row else None
+        return await self.run(cancel)
+
+    async def requeue_stale_jobs(self, heartbeat_before, max_attempts):
+        def requeue(conn):
+            now = datetime.now(timezone.utc).isoformat()
+            stale = "status = 'running' AND heartbeat_at < :before"
+            params = {"before": heartbeat_before.isoformat(), "now": now, "max_attempts": max_attempts}
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    f"UPDATE jobs SET status = 'cancelled', finished_at = :now WHERE {stale} AND cancel_requested = 1",
+                    params,
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = 'Trabajo interrumpido demasiadas veces', "
+                    f"finished_at = :now WHERE {stale} AND attempts >= :max_attempts",
+                    params,
+                )
+                return conn.execute(
+                    f"UPDATE jobs SET status = 'queued', progress = 0, message = '', worker = NULL WHERE {stale}",
+                    params,
+                ).rowcount
+        return await self.run(requeue)
+
+    async def ping(self):
+        await self.read(lambda conn: conn.execute("SELECT 1").fetchone())
+
+    async def close(self):
+        def close():
+            # Waits for readers still in use to come back
+            for _ in range(self.reader_count):
+                self.readers.get().close()
+            with self.lock:
+                self.conn.close()
+        await asyncio.to_thread(close)
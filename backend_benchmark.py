@@ -0,0 +1,322 @@
+import asyncio
+import json
+import math
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import typer
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+
+# 1x1 transparent PNG used to give the company config a logo to read back
+LOGO_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000"
+    "000049454e44ae426082"
+)
+
+SCENARIOS = [
+    "create_note",
+    "list_notes",
+    "update_note",
+    "statistics",
+    "company_config",
+]
+
+app_cli = typer.Typer(help="Benchmark de carga para la API de notas de entrega")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile over an already sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(pct / 100 * len(values)) - 1))
+    return values[rank]
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class DeliveryNotesBenchmark:
+    def __init__(self, client: httpx.AsyncClient, concurrency: int, seed_clients: int, seed_notes: int):
+        self.client = client
+        self.concurrency = concurrency
+        self.seed_clients = seed_clients
+        self.seed_notes = seed_notes
+        self.client_ids: List[str] = []
+        self.note_ids: List[str] = []
+        self.rng = random.Random(42)
+
+    def note_payload(self, client_id: str) -> Dict:
+        return {
+            "client_id": client_id,
+            "delivery_location": {
+                "address": "Zona Industrial Los Ruices, Caracas",
+                "contact_person": "Juan Pérez",
+                "phone": "0414-1234567"
+            },
+            "products": [
+                {
+                    "description": "RESINA ESTIRENO PREFLEX 210",
+                    "package_unit": "TAM",
+                    "package_quantity": self.rng.randint(1, 10),
+                    "sale_unit": "Kg",
+                    "sale_quantity": self.rng.randint(50, 500)
+                }
+            ],
+            "transport": "Transporte Terrestre"
+        }
+
+    async def setup(self):
+        """Create the company config, logo, clients and notes the scenarios read"""
+        response = await self.client.post("/api/company-config", json={
+            "name": "EMPRESA BENCHMARK S.A.",
+            "rif": "J-000000000",
+            "address": "Av. Principal, Caracas, Venezuela",
+            "phone": "0212-0000000"
+        })
+        response.raise_for_status()
+        response = await self.client.post(
+            "/api/company-config/logo",
+            files={"file": ("logo.png", LOGO_PNG, "image/png")}
+        )
+        response.raise_for_status()
+
+        run_tag = datetime.now(timezone.utc).strftime("%H%M%S")
+        for i in range(self.seed_clients):
+            response = await self.client.post("/api/clients", json={
+                "name": f"CLIENTE BENCHMARK {i}",
+                "rif_ci": f"J-BENCH{run_tag}{i:04d}",
+                "address": "CR 36 ENTRE CALLES 23-24",
+                "payment_condition": "Crédito"
+            })
+            response.raise_for_status()
+            self.client_ids.append(response.json()["id"])
+
+        for _ in range(self.seed_notes):
+            response = await self.client.post(
+                "/api/delivery-notes", json=self.note_payload(self.rng.choice(self.client_ids))
+            )
+            response.raise_for_status()
+            self.note_ids.append(response.json()["id"])
+
+    async def request(self, scenario: str) -> httpx.Response:
+        if scenario == "create_note":
+            response = await self.client.post(
+                "/api/delivery-notes", json=self.note_payload(self.rng.choice(self.client_ids))
+            )
+            if response.status_code == 200:
+                self.note_ids.append(response.json()["id"])
+            return response
+        if scenario == "list_notes":
+            return await self.client.get("/api/delivery-notes")
+        if scenario == "update_note":
+            note_id = self.rng.choice(self.note_ids)
+            return await self.client.put(
+                f"/api/delivery-notes/{note_id}", json=self.note_payload(self.rng.choice(self.client_ids))
+            )
+        if scenario == "statistics":
+            return await self.client.get("/api/statistics")
+        if scenario == "company_config":
+            return await self.client.get("/api/company-config")
+        raise ValueError(f"Escenario desconocido: {scenario}")
+
+    async def run_scenario(self, scenario: str, requests_per_scenario: int) -> Dict:
+        """Fire requests_per_scenario requests from `concurrency` concurrent workers"""
+        latencies: List[float] = []
+        errors = 0
+        remaining = iter(range(requests_per_scenario))
+
+        async def worker():
+            nonlocal errors
+            for _ in remaining:
+                start = time.perf_counter()
+                try:
+                    response = await self.request(scenario)
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "elapsed_s": round(elapsed, 4),
+            "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(statistics.fmean(latencies), 3) if latencies else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            "p99_ms": round(percentile(latencies, 99), 3),
+            "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+        }
+
+
+async def build_client(
+    stack: AsyncExitStack, base_url: Optional[str], storage: str, keep_data: bool
+) -> httpx.AsyncClient:
+    """Client against a running server, or the ASGI app loaded in-process on a throwaway store"""
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    if base_url:
+        return await stack.enter_async_context(httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits))
+
+    # Never touch the app's own database: seed a dedicated one (read at import and in the lifespan)
+    os.environ["STORAGE_BACKEND"] = storage
+    if storage == "sqlite":
+        directory = tempfile.mkdtemp(prefix="bench_")
+        os.environ["SQLITE_PATH"] = os.path.join(directory, "bench.db")
+    else:
+        os.environ["DB_NAME"] = f"bench_{datetime.now(timezone.utc):%Y%m%d%H%M%S}"
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    # ASGITransport does not send lifespan events, so open the storage pool here
+    await stack.enter_async_context(server.app.router.lifespan_context(server.app))
+    if not keep_data:
+        if storage == "sqlite":
+            stack.callback(shutil.rmtree, directory, ignore_errors=True)
+        else:
+            # Runs before the lifespan closes the pool
+            stack.push_async_callback(server.repo.client.drop_database, os.environ["DB_NAME"])
+    # Unhandled app errors come back as 500s and are counted, like against a real server
+    transport = httpx.ASGITransport(app=server.app, raise_app_exceptions=False)
+    return await stack.enter_async_context(
+        httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60.0)
+    )
+
+
+def print_report(results: Dict):
+    print("\n" + "=" * 86)
+    print("📊 BENCHMARK RESULTS")
+    print("=" * 86)
+    print(f"{'scenario':<16}{'reqs':>7}{'errors':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, row in results["scenarios"].items():
+        print(
+            f"{name:<16}{row['requests']:>7}{row['errors']:>8}{row['rps']:>10.1f}"
+            f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}"
+        )
+
+
+def print_comparison(results: Dict, baseline: Dict):
+    print("\n" + "=" * 86)
+    print(f"🔁 COMPARED WITH {baseline.get('git_revision') or 'baseline'}")
+    print("=" * 86)
+    print(f"{'scenario':<16}{'rps':>14}{'p50':>14}{'p95':>14}{'p99':>14}")
+
+    def delta(new, old, lower_is_better):
+        if not old:
+            return "n/a"
+        change = (new - old) / old * 100
+        worse = change > 0 if lower_is_better else change < 0
+        return f"{change:+.1f}%{' ⚠️' if worse and abs(change) >= 10 else ''}"
+
+    for name, row in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        print(
+            f"{name:<16}{delta(row['rps'], old['rps'], False):>14}"
+            f"{delta(row['p50_ms'], old['p50_ms'], True):>14}"
+            f"{delta(row['p95_ms'], old['p95_ms'], True):>14}"
+            f"{delta(row['p99_ms'], old['p99_ms'], True):>14}"
+        )
+
+
+async def run_benchmark(base_url, storage, keep_data, concurrency, requests_per_scenario, seed_clients, seed_notes,
+                        scenarios) -> Dict:
+    async with AsyncExitStack() as stack:
+        client = await build_client(stack, base_url, storage, keep_data)
+        bench = DeliveryNotesBenchmark(client, concurrency, seed_clients, seed_notes)
+        print(f"🚀 Seeding {seed_clients} clients and {seed_notes} notes...")
+        await bench.setup()
+
+        results = {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "target": base_url or "in-process",
+            "storage": None if base_url else storage,
+            "concurrency": concurrency,
+            "requests_per_scenario": requests_per_scenario,
+            "seed_clients": seed_clients,
+            "seed_notes": seed_notes,
+            "scenarios": {},
+        }
+        for scenario in scenarios:
+            print(f"🧪 Running {scenario}...")
+            results["scenarios"][scenario] = await bench.run_scenario(scenario, requests_per_scenario)
+        return results
+
+
+@app_cli.command()
+def main(
+    base_url: Optional[str] = typer.Option(
+        None, help="URL of a running server (needs --allow-writes); by default the app runs in-process"
+    ),
+    allow_writes: bool = typer.Option(
+        False, help="Allow seeding --base-url: replaces its company config and leaves test clients and notes"
+    ),
+    storage: str = typer.Option(
+        "mongo", help="In-process store: a throwaway bench_* database on MONGO_URL, or a temporary SQLite file"
+    ),
+    keep_data: bool = typer.Option(False, help="Keep the in-process benchmark store instead of removing it"),
+    concurrency: int = typer.Option(32, help="Concurrent async clients per scenario"),
+    requests_per_scenario: int = typer.Option(1000, "--requests", help="Requests issued per scenario"),
+    seed_clients: int = typer.Option(20, help="Clients created before measuring"),
+    seed_notes: int = typer.Option(200, help="Delivery notes created before measuring"),
+    scenario: List[str] = typer.Option(SCENARIOS, help="Scenarios to run (repeatable)"),
+    output: Path = typer.Option(Path("bench_results.json"), help="Where to write the JSON results"),
+    compare: Optional[Path] = typer.Option(None, help="Previous results file to compare against"),
+):
+    if base_url and not allow_writes:
+        raise typer.BadParameter(
+            "el benchmark escribe datos de prueba en el servidor indicado; confirme con --allow-writes",
+            param_hint="--base-url",
+        )
+    if storage not in ("mongo", "sqlite"):
+        raise typer.BadParameter("use mongo o sqlite", param_hint="--storage")
+    # The scenarios pick a random seeded client and note
+    if seed_clients < 1:
+        raise typer.BadParameter("debe ser al menos 1", param_hint="--seed-clients")
+    if seed_notes < 1:
+        raise typer.BadParameter("debe ser al menos 1", param_hint="--seed-notes")
+    unknown = set(scenario) - set(SCENARIOS)
+    if unknown:
+        raise typer.BadParameter(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run_benchmark(
+        base_url, storage, keep_data, concurrency, requests_per_scenario, seed_clients, seed_notes, scenario
+    ))
+    print_report(results)
+    if compare:
+        print_comparison(results, json.loads(compare.read_text()))
+
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\n💾 Results saved to {output}")
+
+
+if __name__ == "__main__":
+    app_cli()
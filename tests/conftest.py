@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+# The backend modules import each other as top-level modules (uvicorn runs from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def sqlite_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setenv("WARMUP_ON_STARTUP", "false")
+    import jobs
+    monkeypatch.setattr(jobs, "JOB_RESULTS_DIR", tmp_path / "job_results")
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def client(sqlite_env):
+    import server
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture
+def company_client(client):
+    """An API client plus one existing customer"""
+    response = client.post("/api/clients", json={
+        "name": "Plásticos del Centro",
+        "rif_ci": "J-12345678",
+        "address": "Zona Industrial, Valencia",
+        "payment_condition": "Crédito 30 días",
+    })
+    assert response.status_code == 200
+    return client, response.json()
+
+
+
+@pytest.fixture
+def mongo_repo(monkeypatch):
+    """A MongoRepository on an in-memory mongomock database"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import repository
+    monkeypatch.setattr(repository, "AsyncIOMotorClient", mongomock_motor.AsyncMongoMockClient)
+    return repository.MongoRepository("mongodb://localhost", "notas_test")
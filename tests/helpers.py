@@ -0,0 +1,68 @@
+import uuid
+from datetime import datetime, timezone
+
+
+def note_payload(client_id: str, *products) -> dict:
+    return {
+        "client_id": client_id,
+        "delivery_location": {"address": "Galpón 3", "contact_person": "Ana Pérez", "phone": "0414-0000000"},
+        "products": [
+            {"description": description, "package_unit": "SACO", "package_quantity": package_quantity,
+             "sale_unit": "Kg", "sale_quantity": sale_quantity}
+            for description, package_quantity, sale_quantity in (products or [("Resina PET", 2, 50)])
+        ],
+        "transport": "Propio",
+    }
+
+
+def note_dump(*products, created_at=None, **fields) -> dict:
+    """A DeliveryNote model dump, as the routes hand it to a repository"""
+    now = datetime.now(timezone.utc)
+    note = {
+        "id": str(uuid.uuid4()),
+        "note_number": "J-12345678-0001",
+        "issue_date": now,
+        "client_id": "c1",
+        "client_info": {
+            "id": "c1", "name": "Plásticos del Centro", "rif_ci": "J-12345678", "address": "Zona Industrial",
+            "payment_condition": "Contado", "last_note_number": 0, "created_at": now,
+        },
+        "delivery_location": {"address": "Galpón 3", "contact_person": "Ana Pérez", "phone": "0414-0000000"},
+        "products": note_payload("c1", *products)["products"],
+        "transport": "",
+        "received_by_name": "",
+        "received_by_cedula": "",
+        "received_date": None,
+        "created_at": created_at or now,
+    }
+    note.update(fields)
+    return note
+
+
+class WriteFirst:
+    """Collection proxy that runs a concurrent write right before its first bulk_write"""
+
+    def __init__(self, collection, write):
+        self.collection = collection
+        self.write = write
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, *args, **kwargs):
+        if self.write:
+            write, self.write = self.write, None
+            await write()
+        return await self.collection.bulk_write(*args, **kwargs)
+
+
+def move_after_lookup(repo, move):
+    """Make the next find_note return what it found, but only after move() ran"""
+    find_note = repo.find_note
+
+    async def racing(note_id):
+        found = await find_note(note_id)
+        repo.find_note = find_note
+        await move()
+        return found
+    repo.find_note = racing
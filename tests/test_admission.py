@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from admission import ConcurrencyLimiter, parse_limits
+
+
+def test_parse_limits():
+    assert parse_limits(" statistics=2, delivery-notes = 4 ,") == {"statistics": 2, "delivery-notes": 4}
+
+
+def test_full_queue_is_rejected_with_429():
+    async def main():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_timeout=5, max_queue=1)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter:
+                await release.wait()
+
+        running = [asyncio.ensure_future(hold()) for _ in range(2)]  # one holds the slot, one waits
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            async with limiter:
+                pass
+        release.set()
+        await asyncio.gather(*running)
+        return rejected.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 429
+    assert error.headers == {"Retry-After": "5"}
+
+
+def test_waiting_too_long_gets_503():
+    async def main():
+        limiter = ConcurrencyLimiter("test", limit=1, queue_timeout=0.05, max_queue=10)
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter:
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as timed_out:
+            async with limiter:
+                pass
+        release.set()
+        await holder
+        # Slots and the queue count are given back
+        assert limiter.pending == 0
+        async with limiter:
+            pass
+        return timed_out.value
+
+    error = asyncio.run(main())
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+
+
+def test_heavy_routes_answer_429_when_saturated(client, monkeypatch):
+    import server
+    monkeypatch.setattr(server, "clients_limiter", ConcurrencyLimiter("clients", limit=0, max_queue=0))
+    response = client.get("/api/clients")
+    assert response.status_code == 429
+    assert "retry-after" in response.headers
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from tests.helpers import note_payload
+
+
+def test_company_config_is_replaced_and_gets_a_logo(client):
+    assert client.get("/api/company-config").json() is None
+
+    for name in ("Primera", "Segunda"):
+        response = client.post("/api/company-config", json={
+            "name": name, "rif": "J-1", "address": "Caracas", "phone": "0212-0000000"
+        })
+        assert response.status_code == 200
+    assert client.get("/api/company-config").json()["name"] == "Segunda"
+
+    response = client.post("/api/company-config/logo", files={"file": ("logo.png", b"\x89PNG", "image/png")})
+    assert response.status_code == 200
+    assert client.get("/api/company-config").json()["logo"].startswith("data:image/png;base64,")
+
+    response = client.post("/api/company-config/logo", files={"file": ("logo.txt", b"x", "text/plain")})
+    assert response.status_code == 400
+
+
+def test_clients(company_client):
+    client, customer = company_client
+    assert client.get(f"/api/clients/{customer['id']}").json()["name"] == "Plásticos del Centro"
+    assert [c["id"] for c in client.get("/api/clients").json()] == [customer["id"]]
+    assert client.get("/api/clients/missing").status_code == 404
+
+
+def test_delivery_note_crud(company_client):
+    client, customer = company_client
+    response = client.post("/api/delivery-notes", json=note_payload(customer["id"]))
+    assert response.status_code == 200
+    note = response.json()
+    assert note["note_number"] == "J-12345678-001"
+    assert note["client_info"]["name"] == "Plásticos del Centro"
+
+    assert client.get(f"/api/delivery-notes/{note['id']}").json() == note
+    assert [n["id"] for n in client.get("/api/delivery-notes").json()] == [note["id"]]
+
+    response = client.put(f"/api/delivery-notes/{note['id']}", json=note_payload(customer["id"], ("Resina PP", 1, 25)))
+    assert response.status_code == 200
+    assert response.json()["products"][0]["description"] == "Resina PP"
+    assert response.json()["note_number"] == note["note_number"]
+
+    assert client.delete(f"/api/delivery-notes/{note['id']}").status_code == 200
+    assert client.get(f"/api/delivery-notes/{note['id']}").status_code == 404
+    assert client.delete(f"/api/delivery-notes/{note['id']}").status_code == 404
+    assert client.get("/api/delivery-notes").json() == []
+
+
+def test_delivery_note_for_unknown_client(client):
+    assert client.post("/api/delivery-notes", json=note_payload("missing")).status_code == 404
+
+
+def test_note_numbers_are_sequential_and_unique_under_concurrency(company_client):
+    client, customer = company_client
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(
+            lambda _: client.post("/api/delivery-notes", json=note_payload(customer["id"])), range(20)
+        ))
+    numbers = sorted(response.json()["note_number"] for response in responses)
+    assert numbers == [f"J-12345678-{n:03d}" for n in range(1, 21)]
+    assert client.get(f"/api/clients/{customer['id']}").json()["last_note_number"] == 20
+
+
+def test_statistics(company_client):
+    client, customer = company_client
+    other = client.post("/api/clients", json={
+        "name": "Envases Oriente", "rif_ci": "J-87654321", "address": "Barcelona", "payment_condition": "Contado"
+    }).json()
+    for client_id in (customer["id"], customer["id"], other["id"]):
+        client.post("/api/delivery-notes", json=note_payload(client_id))
+
+    stats = client.get("/api/statistics").json()
+    assert stats["total_notes"] == 3
+    assert stats["total_clients"] == 2
+    assert stats["notes_by_client"] == [
+        {"_id": "Plásticos del Centro", "count": 2},
+        {"_id": "Envases Oriente", "count": 1},
+    ]
+
+
+def test_health(client):
+    assert client.get("/api/health/live").json() == {"status": "ok"}
+    assert client.get("/api/health/ready").json() == {"status": "ready"}
+
+
+def test_reads_are_not_blocked_by_a_running_write(company_client):
+    client, customer = company_client
+    import server
+
+    # Hold the write connection as a long transaction would
+    with ThreadPoolExecutor(1) as pool, server.repo.lock:
+        response = pool.submit(client.get, f"/api/clients/{customer['id']}").result(timeout=5)
+    assert response.json()["name"] == customer["name"]
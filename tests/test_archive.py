@@ -0,0 +1,75 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from archive import ARCHIVE_COLLECTION, move_batch
+from tests.helpers import WriteFirst, move_after_lookup, note_dump
+
+
+def old_note(*products):
+    return note_dump(*products, created_at=datetime.now(timezone.utc) - timedelta(days=400))
+
+
+def test_move_batch_keeps_documents_changed_while_copying(mongo_repo):
+    db = mongo_repo.db
+
+    async def main():
+        await db.delivery_notes.insert_many([{"_id": n, "n": n} for n in range(4)])
+        # A copy left behind by an interrupted run is refreshed
+        await db[ARCHIVE_COLLECTION].insert_one({"_id": 3, "n": -1})
+        batch = await db.delivery_notes.find().to_list(None)
+
+        async def api_writes():
+            await db.delivery_notes.update_one({"_id": 1}, {"$set": {"transport": "Moto"}})
+            await db.delivery_notes.delete_one({"_id": 2})
+
+        kept = await move_batch(db.delivery_notes, WriteFirst(db[ARCHIVE_COLLECTION], api_writes), batch)
+        assert sorted(kept) == [1, 2]
+        assert await db.delivery_notes.find().to_list(None) == [{"_id": 1, "n": 1, "transport": "Moto"}]
+        assert await db[ARCHIVE_COLLECTION].find().sort("_id", 1).to_list(None) == [
+            {"_id": 0, "n": 0}, {"_id": 3, "n": 3}
+        ]
+
+    asyncio.run(main())
+
+
+def test_update_retries_when_the_note_is_archived_meanwhile(mongo_repo):
+    async def main():
+        note = old_note(("Resina PET", 2, 50))
+        await mongo_repo.insert_note(note)
+        move_after_lookup(mongo_repo, lambda: mongo_repo.archive_notes(180))
+
+        products = note_dump(("Tapas", 1, 10))["products"]
+        updated = await mongo_repo.update_note(note["id"], {"products": products})
+        assert updated["products"] == products
+        assert await mongo_repo.db.delivery_notes.count_documents({}) == 0
+        assert (await mongo_repo.get_note(note["id"]))["products"] == products
+        assert [(entry["key"], entry["line_count"]) for entry in await mongo_repo.list_products()] == [("TAPAS", 1)]
+
+    asyncio.run(main())
+
+
+def test_delete_retries_when_the_note_is_archived_meanwhile(mongo_repo):
+    async def main():
+        note = old_note(("Resina PET", 2, 50))
+        await mongo_repo.insert_note(note)
+        move_after_lookup(mongo_repo, lambda: mongo_repo.archive_notes(180))
+
+        assert await mongo_repo.delete_note(note["id"]) is True
+        assert await mongo_repo.get_note(note["id"]) is None
+        assert await mongo_repo.count_notes() == 0
+        assert await mongo_repo.list_products() == []
+
+    asyncio.run(main())
+
+
+def test_delete_of_a_note_deleted_meanwhile_reports_not_found(mongo_repo):
+    async def main():
+        note = old_note(("Resina PET", 2, 50))
+        await mongo_repo.insert_note(note)
+        move_after_lookup(mongo_repo, lambda: mongo_repo.db.delivery_notes.delete_many({}))
+
+        assert await mongo_repo.delete_note(note["id"]) is False
+        # The catalog is only updated by the delete that removed the note
+        assert (await mongo_repo.list_products())[0]["line_count"] == 1
+
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+from tests.helpers import note_payload
+
+
+def products(client):
+    return {p["key"]: p for p in client.get("/api/products").json()}
+
+
+def test_catalog_follows_note_writes(company_client):
+    client, customer = company_client
+    first = client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PET", 2, 50))).json()
+    client.post("/api/delivery-notes", json=note_payload(customer["id"], ("resina  pét", 1, 10), ("Tapas", 5, 100)))
+
+    catalog = products(client)
+    assert catalog["RESINA PET"]["line_count"] == 2
+    assert catalog["RESINA PET"]["total_package_quantity"] == 3
+    assert catalog["RESINA PET"]["total_sale_quantity"] == 60
+    # The latest spelling is the one shown
+    assert catalog["RESINA PET"]["description"] == "resina  pét"
+
+    client.put(f"/api/delivery-notes/{first['id']}", json=note_payload(customer["id"], ("Tapas", 1, 20)))
+    catalog = products(client)
+    assert catalog["RESINA PET"]["line_count"] == 1
+    assert catalog["RESINA PET"]["total_sale_quantity"] == 10
+    assert catalog["TAPAS"]["line_count"] == 2
+    assert catalog["TAPAS"]["total_sale_quantity"] == 120
+
+    client.delete(f"/api/delivery-notes/{first['id']}")
+    catalog = products(client)
+    assert catalog["TAPAS"]["line_count"] == 1
+    assert catalog["TAPAS"]["total_sale_quantity"] == 100
+
+
+def test_deleting_the_last_line_hides_the_product(company_client):
+    client, customer = company_client
+    note = client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Pigmento", 1, 5))).json()
+    client.delete(f"/api/delivery-notes/{note['id']}")
+    assert "PIGMENTO" not in products(client)
+
+
+def test_autocomplete_matches_normalized_prefix(company_client):
+    client, customer = company_client
+    client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PET", 1, 1), ("Resina PP", 1, 1)))
+    client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PP", 1, 1), ("Tapas", 1, 1)))
+
+    matches = client.get("/api/products/autocomplete", params={"q": "résina"}).json()
+    assert [m["key"] for m in matches] == ["RESINA PP", "RESINA PET"]
+    assert client.get("/api/products/autocomplete", params={"q": "resina", "limit": 1}).json()[0]["key"] == "RESINA PP"
+
+
+def test_rebuild_fixes_drifted_totals(company_client):
+    client, customer = company_client
+    client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PET", 2, 50)))
+    import server
+
+    def drift(conn):
+        conn.execute("UPDATE product_catalog SET line_count = 9")
+        conn.execute("INSERT INTO product_catalog VALUES ('FANTASMA', 'Fantasma', 'U', 'U', 3, 0, 0, '')")
+    client.portal.call(server.repo.run, drift)
+
+    assert client.portal.call(server.repo.rebuild_product_catalog) == 1
+    catalog = products(client)
+    assert list(catalog) == ["RESINA PET"]
+    assert catalog["RESINA PET"]["line_count"] == 1
+
+
+def test_rebuild_keeps_edits_made_during_the_scan(company_client):
+    client, customer = company_client
+    client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PET", 10, 100)))
+    second = client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PET", 10, 100))).json()
+    import server
+
+    async def edit_second_note(scanned, total):
+        # The scan has only reached the first note
+        if scanned == 1:
+            edited = note_payload(customer["id"], ("Resina PET", 1, 10))["products"]
+            await server.repo.update_note(second["id"], {"products": edited})
+
+    assert client.portal.call(server.repo.rebuild_product_catalog, edit_second_note, 1) == 1
+    catalog = products(client)
+    assert catalog["RESINA PET"]["line_count"] == 2
+    assert catalog["RESINA PET"]["total_package_quantity"] == 11
+    assert catalog["RESINA PET"]["total_sale_quantity"] == 110
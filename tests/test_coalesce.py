@@ -0,0 +1,81 @@
+import asyncio
+
+from coalesce import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*(flight.do("notes", load) for _ in range(10)))
+        assert results == [1] * 10
+        # Without a TTL nothing is kept once the call finished
+        assert await flight.do("notes", load) == 2
+
+    asyncio.run(main())
+    assert calls == 2
+
+
+def test_forget_drops_the_cached_result():
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def main():
+        flight = SingleFlight(ttl=60)
+        assert await flight.do("stats", load) == 1
+        assert await flight.do("stats", load) == 1
+        flight.forget("stats")
+        assert await flight.do("stats", load) == 2
+
+    asyncio.run(main())
+
+
+def test_forget_while_in_flight_makes_later_callers_reload():
+    async def main():
+        release = asyncio.Event()
+        calls = []
+
+        async def load():
+            calls.append(None)
+            await release.wait()
+            return len(calls)
+
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("notes", load))
+        await asyncio.sleep(0)
+        # A write lands while the first read is running
+        flight.forget("notes")
+        second = asyncio.ensure_future(flight.do("notes", load))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, second)
+        assert len(calls) == 2
+
+    asyncio.run(main())
+
+
+def test_errors_are_shared_and_not_cached():
+    async def fail():
+        raise RuntimeError("boom")
+
+    async def succeed():
+        return "ok"
+
+    async def main():
+        flight = SingleFlight(ttl=60)
+        results = await asyncio.gather(*(flight.do("x", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert await flight.do("x", succeed) == "ok"
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+import hashlib
+import json
+
+from tests.helpers import note_payload
+
+
+def post(client, body: dict, key: str):
+    return client.post(
+        "/api/delivery-notes",
+        content=json.dumps(body).encode(),
+        headers={"Content-Type": "application/json", "Idempotency-Key": key},
+    )
+
+
+def test_retry_replays_the_first_response(company_client):
+    client, customer = company_client
+    body = note_payload(customer["id"])
+    first = post(client, body, "alta-1")
+    retry = post(client, body, "alta-1")
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in first.headers
+    assert len(client.get("/api/delivery-notes").json()) == 1
+
+
+def test_same_key_with_another_body_is_rejected(company_client):
+    client, customer = company_client
+    assert post(client, note_payload(customer["id"]), "alta-2").status_code == 200
+    response = post(client, note_payload(customer["id"], ("Otra cosa", 1, 1)), "alta-2")
+    assert response.status_code == 422
+    assert len(client.get("/api/delivery-notes").json()) == 1
+
+
+def test_failed_requests_are_not_stored(client):
+    body = note_payload("missing")
+    assert post(client, body, "alta-3").status_code == 404
+    assert "idempotent-replayed" not in post(client, body, "alta-3").headers
+
+
+def reserve_in_flight(client, key: str, body: dict):
+    """Reserve key the way the middleware does for a request that is still running"""
+    import server
+    fingerprint = hashlib.sha256(b"/api/delivery-notes?\n" + json.dumps(body).encode()).hexdigest()
+    assert client.portal.call(server.repo.reserve_idempotency_key, key, fingerprint) is None
+
+
+def test_retry_while_the_original_is_in_flight_gets_409(company_client):
+    client, customer = company_client
+    body = note_payload(customer["id"])
+    reserve_in_flight(client, "alta-4", body)
+
+    response = post(client, body, "alta-4")
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/api/delivery-notes").json() == []
+
+
+def test_stale_reservation_is_taken_over(company_client, monkeypatch):
+    import sqlite_repository
+    client, customer = company_client
+    body = note_payload(customer["id"])
+    reserve_in_flight(client, "alta-5", body)
+
+    # The original request died; once its lease is over a retry runs for real
+    monkeypatch.setattr(sqlite_repository, "IDEMPOTENCY_LEASE_SECONDS", -1)
+    assert post(client, body, "alta-5").status_code == 200
+    assert post(client, body, "alta-5").headers["idempotent-replayed"] == "true"
+    assert len(client.get("/api/delivery-notes").json()) == 1
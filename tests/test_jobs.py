@@ -0,0 +1,169 @@
+import asyncio
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import jobs
+from tests.helpers import note_payload
+
+
+@jobs.job_handler("test-wait")
+async def wait_job(ctx, params):
+    """Runs until cancelled, reporting progress along the way"""
+    for step in range(10000):
+        await ctx.progress(step, 10000)
+        await asyncio.sleep(0.01)
+
+
+def wait_for_status(client, job_id: str, *statuses: str, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in statuses or time.monotonic() > deadline:
+            assert job["status"] in statuses
+            return job
+        time.sleep(0.02)
+
+
+def start(client, job_type: str, **params) -> dict:
+    response = client.post("/api/jobs", json={"type": job_type, "params": params})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+    return response.json()
+
+
+def test_unknown_and_unsupported_job_types_are_rejected(client):
+    assert client.post("/api/jobs", json={"type": "nope"}).status_code == 400
+    # SQLite keeps no archive collection
+    assert client.post("/api/jobs", json={"type": "archive-notes"}).status_code == 400
+    assert client.get("/api/jobs/missing").status_code == 404
+    assert client.post("/api/jobs/missing/cancel").status_code == 404
+
+
+def test_statistics_job_result(company_client):
+    client, customer = company_client
+    client.post("/api/delivery-notes", json=note_payload(customer["id"]))
+    job = start(client, "statistics")
+    job = wait_for_status(client, job["id"], "succeeded")
+    assert job["progress"] == 100
+    assert client.get(f"/api/jobs/{job['id']}/result").json()["total_notes"] == 1
+
+
+def test_export_job_produces_a_csv(company_client):
+    client, customer = company_client
+    for _ in range(3):
+        client.post("/api/delivery-notes", json=note_payload(customer["id"], ("Resina PET", 2, 50), ("Tapas", 1, 9)))
+    job = wait_for_status(client, start(client, "export-notes")["id"], "succeeded")
+
+    response = client.get(f"/api/jobs/{job['id']}/result")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("note_number,issue_date,client_name")
+    assert len(lines) == 1 + 3 * 2
+
+
+def test_result_of_an_unfinished_job_is_409(client):
+    job = start(client, "test-wait")
+    wait_for_status(client, job["id"], "running")
+    assert client.get(f"/api/jobs/{job['id']}/result").status_code == 409
+    client.post(f"/api/jobs/{job['id']}/cancel")
+    wait_for_status(client, job["id"], "cancelled")
+
+
+def test_cancel_running_and_queued_jobs(client):
+    running = [start(client, "test-wait") for _ in range(jobs.JOB_WORKERS)]
+    for job in running:
+        wait_for_status(client, job["id"], "running")
+    queued = start(client, "test-wait")
+
+    # Every worker slot is busy, so this one is cancelled before it starts
+    response = client.post(f"/api/jobs/{queued['id']}/cancel").json()
+    assert response["status"] == "cancelled"
+
+    response = client.post(f"/api/jobs/{running[0]['id']}/cancel").json()
+    assert response["status"] == "running"
+    assert response["cancel_requested"] is True
+    job = wait_for_status(client, running[0]["id"], "cancelled")
+    assert job["finished_at"] is not None
+    assert 0 <= job["progress"] < 100
+
+    for job in running[1:]:
+        client.post(f"/api/jobs/{job['id']}/cancel")
+        wait_for_status(client, job["id"], "cancelled")
+    assert client.get(f"/api/jobs/{queued['id']}").json()["started_at"] is None
+
+
+def test_shutdown_requeues_running_jobs(sqlite_env):
+    import server
+    with TestClient(server.app) as client:
+        job = start(client, "test-wait")
+        wait_for_status(client, job["id"], "running")
+
+    conn = sqlite3.connect(sqlite_env)
+    status, attempts, worker, progress = conn.execute(
+        "SELECT status, attempts, worker, progress FROM jobs WHERE id = ?", (job["id"],)
+    ).fetchone()
+    conn.close()
+    assert (status, attempts, worker, progress) == ("queued", 0, None, 0)
+
+    # The next start picks it up again
+    with TestClient(server.app) as client:
+        resumed = wait_for_status(client, job["id"], "running")
+        assert resumed["attempts"] == 1
+        client.post(f"/api/jobs/{job['id']}/cancel")
+        wait_for_status(client, job["id"], "cancelled")
+
+
+@pytest.mark.parametrize("attempts, outcome", [(1, "succeeded"), (jobs.MAX_ATTEMPTS, "failed")])
+def test_jobs_of_a_dead_worker_are_recovered(client, attempts, outcome):
+    import server
+    job = jobs.new_job("statistics", {})
+    job.update(status="running", attempts=attempts, worker="gone:1",
+               heartbeat_at=datetime.now(timezone.utc) - timedelta(hours=1))
+    client.portal.call(server.repo.insert_job, job)
+
+    client.portal.call(server.jobs.requeue_stale)
+    server.jobs.notify()
+    job = wait_for_status(client, job["id"], outcome)
+    if outcome == "failed":
+        assert job["error"] == "Trabajo interrumpido demasiadas veces"
+
+
+def test_heartbeat_outlives_a_failed_update():
+    class FlakyRepo:
+        calls = 0
+
+        async def update_job(self, job_id, fields):
+            self.calls += 1
+            if self.calls == 1:
+                raise RuntimeError("database unavailable")
+            return {"cancel_requested": self.calls == 3}
+
+    async def main():
+        repo = FlakyRepo()
+        runner = jobs.JobRunner(repo, heartbeat_interval=0.01)
+        task = asyncio.create_task(asyncio.sleep(10))
+        heartbeat = asyncio.create_task(runner.heartbeat("job-1", task))
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        heartbeat.cancel()
+        assert repo.calls == 3
+
+    asyncio.run(main())
+
+
+def test_expired_results_are_purged(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RESULTS_DIR", tmp_path)
+    expired, recent = tmp_path / "expired.csv", tmp_path / "recent.csv"
+    expired.write_text("note_number\n")
+    recent.write_text("note_number\n")
+    eight_days_ago = time.time() - 8 * 86400
+    os.utime(expired, (eight_days_ago, eight_days_ago))
+
+    assert jobs.purge_results(7) == 1
+    assert list(tmp_path.iterdir()) == [recent]
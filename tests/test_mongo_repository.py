@@ -0,0 +1,140 @@
+"""MongoRepository on mongomock-motor.
+
+mongomock has no ``$unionWith``, so ``statistics`` is only covered by the
+SQLite suite.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from bson.binary import Binary
+
+from archive import ARCHIVE_COLLECTION
+from note_schema import decode_note, encode_note
+from tests.helpers import note_dump
+
+
+def test_encode_note_is_compact_and_decodes_back():
+    note = note_dump(("Resina PET", 2, 50))
+    doc = encode_note(note)
+
+    assert doc["_id"] == Binary.from_uuid(uuid.UUID(note["id"]))
+    assert "id" not in doc
+    assert "transport" not in doc and "received_date" not in doc
+    assert set(doc["client_info"]) == {"name", "rif_ci", "address", "payment_condition"}
+    # The snapshot counter is rebuilt from the note number
+    assert decode_note(doc) == {**note, "client_info": {**note["client_info"], "last_note_number": 0}}
+
+
+def test_decode_note_reads_legacy_documents():
+    note = note_dump(("Resina PET", 2, 50), transport="Propio")
+    assert decode_note({"_id": "legacy-object-id", **note}) == note
+
+
+def test_note_crud(mongo_repo):
+    async def main():
+        note = note_dump(("Resina PET", 2, 50))
+        await mongo_repo.insert_note(note)
+        assert (await mongo_repo.get_note(note["id"]))["products"] == note["products"]
+
+        updated = await mongo_repo.update_note(note["id"], {"transport": "Moto"})
+        assert updated["transport"] == "Moto"
+        assert updated["client_info"]["name"] == note["client_info"]["name"]
+        assert await mongo_repo.count_notes() == 1
+
+        assert await mongo_repo.delete_note(note["id"]) is True
+        assert await mongo_repo.get_note(note["id"]) is None
+        assert await mongo_repo.delete_note(note["id"]) is False
+        assert await mongo_repo.update_note(note["id"], {"transport": "Moto"}) is None
+
+    asyncio.run(main())
+
+
+def test_catalog_follows_note_writes(mongo_repo):
+    async def main():
+        note = note_dump(("Resina PET", 2, 50), ("Tapas", 1, 10))
+        await mongo_repo.insert_note(note)
+        await mongo_repo.insert_note(note_dump(("resina pét", 1, 5)))
+        await mongo_repo.update_note(note["id"], {"products": note_dump(("Tapas", 3, 30))["products"]})
+
+        catalog = {entry["key"]: entry for entry in await mongo_repo.list_products()}
+        assert catalog["RESINA PET"]["line_count"] == 1
+        assert catalog["RESINA PET"]["total_sale_quantity"] == 5
+        assert catalog["TAPAS"]["total_package_quantity"] == 3
+
+        await mongo_repo.delete_note(note["id"])
+        assert [entry["key"] for entry in await mongo_repo.autocomplete_products("res")] == ["RESINA PET"]
+        assert await mongo_repo.autocomplete_products("tap") == []
+
+    asyncio.run(main())
+
+
+def test_archived_notes_are_still_served(mongo_repo):
+    async def main():
+        old = note_dump(("Resina PET", 2, 50), created_at=datetime.now(timezone.utc) - timedelta(days=400))
+        recent = note_dump(("Tapas", 1, 10))
+        await mongo_repo.insert_note(old)
+        await mongo_repo.insert_note(recent)
+
+        assert await mongo_repo.archive_notes(180) == 1
+        assert await mongo_repo.db[ARCHIVE_COLLECTION].count_documents({}) == 1
+        assert [note["id"] for note in await mongo_repo.list_notes()] == [recent["id"], old["id"]]
+        batches = [batch async for batch in mongo_repo.iter_notes(1)]
+        assert [note["id"] for batch in batches for note in batch] == [old["id"], recent["id"]]
+        assert await mongo_repo.count_notes() == 2
+
+        assert (await mongo_repo.update_note(old["id"], {"transport": "Moto"}))["transport"] == "Moto"
+        assert (await mongo_repo.get_note(old["id"]))["transport"] == "Moto"
+        assert await mongo_repo.delete_note(old["id"]) is True
+        assert await mongo_repo.db[ARCHIVE_COLLECTION].count_documents({}) == 0
+
+    asyncio.run(main())
+
+
+def test_rebuild_fixes_drifted_totals(mongo_repo):
+    async def main():
+        await mongo_repo.insert_note(note_dump(("Resina PET", 2, 50)))
+        catalog = mongo_repo.db.product_catalog
+        await catalog.update_one({"_id": "RESINA PET"}, {"$set": {"line_count": 9}})
+        await catalog.insert_one({"_id": "FANTASMA", "description": "Fantasma", "line_count": 3,
+                                  "total_package_quantity": 0, "total_sale_quantity": 0})
+
+        assert await mongo_repo.rebuild_product_catalog() == 1
+        assert [(entry["key"], entry["line_count"]) for entry in await mongo_repo.list_products()] == [
+            ("RESINA PET", 1)
+        ]
+
+    asyncio.run(main())
+
+
+def test_job_claims_and_cancellation(mongo_repo):
+    from jobs import new_job
+
+    async def main():
+        first, second = new_job("statistics", {}), new_job("statistics", {})
+        second["created_at"] = first["created_at"] + timedelta(seconds=1)
+        await mongo_repo.insert_job(second)
+        await mongo_repo.insert_job(first)
+
+        claimed = await mongo_repo.claim_job("worker-1")
+        assert (claimed["id"], claimed["status"], claimed["attempts"]) == (first["id"], "running", 1)
+        assert (await mongo_repo.request_job_cancel(first["id"]))["cancel_requested"] is True
+        assert (await mongo_repo.request_job_cancel(second["id"]))["status"] == "cancelled"
+        assert await mongo_repo.claim_job("worker-1") is None
+
+        requeued = await mongo_repo.requeue_stale_jobs(datetime.now(timezone.utc) + timedelta(minutes=1), 3)
+        assert requeued == 0
+        assert (await mongo_repo.get_job(first["id"]))["status"] == "cancelled"
+
+    asyncio.run(main())
+
+
+def test_idempotency_reservation(mongo_repo):
+    async def main():
+        assert await mongo_repo.reserve_idempotency_key("k", "f1") is None
+        assert (await mongo_repo.reserve_idempotency_key("k", "f1"))["status_code"] is None
+        await mongo_repo.complete_idempotency_key("k", 200, "application/json", b"{}")
+        stored = await mongo_repo.reserve_idempotency_key("k", "f1")
+        assert (stored["status_code"], stored["body"]) == (200, b"{}")
+
+    asyncio.run(main())
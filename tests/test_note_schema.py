@@ -0,0 +1,71 @@
+import asyncio
+
+from archive import move_batch
+from note_schema import encode_note, migrate_collection
+from tests.helpers import WriteFirst, move_after_lookup, note_dump
+
+
+async def insert_legacy(repo, *notes):
+    """Store notes in the layout used before the compact encoding (ObjectId _id, string id)"""
+    await repo.db.delivery_notes.insert_many([dict(note) for note in notes])
+
+
+def test_migration_rewrites_legacy_notes(mongo_repo):
+    async def main():
+        notes = [note_dump(("Resina PET", 2, 50)) for _ in range(3)]
+        await insert_legacy(mongo_repo, *notes)
+
+        assert await migrate_collection(mongo_repo.db, "delivery_notes", batch_size=2) == 3
+        assert await mongo_repo.db.delivery_notes.count_documents({"id": {"$exists": True}}) == 0
+        for note in notes:
+            migrated = await mongo_repo.get_note(note["id"])
+            assert (migrated["note_number"], migrated["products"]) == (note["note_number"], note["products"])
+        assert await migrate_collection(mongo_repo.db, "delivery_notes", batch_size=2) == 0
+
+    asyncio.run(main())
+
+
+def test_migration_keeps_notes_changed_while_rewriting(mongo_repo):
+    collection = mongo_repo.db.delivery_notes
+
+    async def main():
+        notes = [note_dump(("Resina PET", 2, 50)) for _ in range(3)]
+        await insert_legacy(mongo_repo, *notes)
+        batch = await collection.find().to_list(None)
+
+        async def api_writes():
+            await collection.update_one({"id": notes[1]["id"]}, {"$set": {"transport": "Moto"}})
+            await collection.delete_one({"id": notes[2]["id"]})
+
+        kept = await move_batch(collection, WriteFirst(collection, api_writes), batch, encode_note)
+        assert len(kept) == 2
+        assert (await mongo_repo.get_note(notes[1]["id"]))["transport"] == "Moto"
+        assert await mongo_repo.get_note(notes[2]["id"]) is None
+        assert await collection.count_documents({}) == 2
+
+    asyncio.run(main())
+
+
+def test_update_retries_when_the_note_is_migrated_meanwhile(mongo_repo):
+    async def main():
+        note = note_dump(("Resina PET", 2, 50))
+        await insert_legacy(mongo_repo, note)
+        move_after_lookup(mongo_repo, lambda: migrate_collection(mongo_repo.db, "delivery_notes", 10))
+
+        assert (await mongo_repo.update_note(note["id"], {"transport": "Moto"}))["transport"] == "Moto"
+        assert (await mongo_repo.get_note(note["id"]))["transport"] == "Moto"
+        assert await mongo_repo.db.delivery_notes.count_documents({"id": {"$exists": True}}) == 0
+
+    asyncio.run(main())
+
+
+def test_delete_retries_when_the_note_is_migrated_meanwhile(mongo_repo):
+    async def main():
+        note = note_dump(("Resina PET", 2, 50))
+        await insert_legacy(mongo_repo, note)
+        move_after_lookup(mongo_repo, lambda: migrate_collection(mongo_repo.db, "delivery_notes", 10))
+
+        assert await mongo_repo.delete_note(note["id"]) is True
+        assert await mongo_repo.db.delivery_notes.count_documents({}) == 0
+
+    asyncio.run(main())